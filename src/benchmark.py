@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from individual import Individual
+from population import Population
+from selection import top_bottom_k
+from change_tracking import ChangeTracker
+from online_stats import RoundStatistics
+from runner import run_rounds
+from random_source import RandomSource, BIT_GENERATORS, MEAN, SD
+
+# Headless timings of the simulation phases, python -m benchmark from src/. Every case is one
+# (path, n, rounds) combination; each phase is timed over all rounds and reported as one JSON line
+# with throughput, and peak memory from a separate tracemalloc pass so tracing never skews the times.
+
+PHASES = ("generate", "reshuffle", "select", "track_changes", "statistics")
+
+
+class ObjectPath:
+    # The original list-of-Individuals implementation, kept as the reference the vectorized code is measured against
+    name = "object"
+
+    def __init__(self, n, weight_genetic, k, rng, dtype=None):
+        # Boxed Python floats, so there is no dtype to choose
+        self.n = n
+        self.weight_genetic = weight_genetic
+        self.k = k
+        self.rng = rng
+
+    def generate(self):
+        self.population = [Individual(i, self.rng.normal(MEAN, SD), self.rng.normal(MEAN, SD)) for i in range(1, self.n + 1)]
+        self.update_phenotypes()
+        self.top_ids = []
+        self.bottom_ids = []
+
+    def update_phenotypes(self):
+        for individual in self.population:
+            individual.phenotype = individual.calculate_phenotype(self.weight_genetic)
+
+    def reshuffle(self):
+        self.previous_population = [Individual(ind.id, ind.intrinsic_value, ind.extrinsic_value) for ind in self.population]
+        for individual in self.population:
+            individual.extrinsic_value = self.rng.normal(MEAN, SD)
+        self.update_phenotypes()
+
+    def select(self):
+        sorted_population = sorted(self.population, key=lambda x: x.phenotype, reverse=True)
+        self.previous_top_ids = self.top_ids
+        self.previous_bottom_ids = self.bottom_ids
+        self.top_ids = [ind.id for ind in sorted_population[:self.k]]
+        self.bottom_ids = [ind.id for ind in sorted_population[-self.k:]]
+
+    def track_changes(self):
+        current_phenotypes = {ind.id: ind.calculate_phenotype(self.weight_genetic) for ind in self.population}
+        previous_phenotypes = {ind.id: ind.calculate_phenotype(self.weight_genetic) for ind in self.previous_population}
+        ids = self.previous_top_ids + self.previous_bottom_ids + self.top_ids + self.bottom_ids
+        self.changes = ", ".join(f"ID {id}: {current_phenotypes[id] - previous_phenotypes[id]:+.2f}" for id in ids)
+
+    def statistics(self):
+        phenotypes = [ind.phenotype for ind in self.population]
+        previous_phenotypes = [ind.phenotype for ind in self.previous_population]
+        self.summary = (np.mean(phenotypes), np.std(phenotypes), np.mean(previous_phenotypes), np.std(previous_phenotypes))
+
+
+class VectorizedPath:
+    # What the apps run now: columnar Population, argpartition selection, whole-population change tracking
+    name = "vectorized"
+
+    def __init__(self, n, weight_genetic, k, rng, dtype=np.float64):
+        self.n = n
+        self.weight_genetic = weight_genetic
+        self.k = k
+        self.rng = rng
+        self.dtype = dtype
+
+    def generate(self):
+        self.population = Population.generate(self.n, self.weight_genetic, self.rng, self.dtype)
+        self.previous = np.empty_like(self.population.phenotype)
+        self.tracker = ChangeTracker(self.population.id, self.dtype)
+        self.round_statistics = RoundStatistics()
+        self.round_statistics.add_round(self.population.phenotype)
+        self.top_positions, self.bottom_positions = top_bottom_k(self.population.phenotype, self.k)
+
+    def reshuffle(self):
+        np.copyto(self.previous, self.population.phenotype)
+        self.population.reshuffle_environment(self.rng)
+        self.population.calculate_phenotype(self.weight_genetic)
+
+    def select(self):
+        self.previous_top_positions, self.previous_bottom_positions = self.top_positions, self.bottom_positions
+        self.top_positions, self.bottom_positions = top_bottom_k(self.population.phenotype, self.k)
+
+    def track_changes(self):
+        self.tracker.update(self.previous, self.population.phenotype)
+        positions = np.concatenate([self.previous_top_positions, self.previous_bottom_positions, self.top_positions, self.bottom_positions])
+        self.changes = self.tracker.labels(positions)
+
+    def statistics(self):
+        self.round_statistics.add_round(self.population.phenotype, self.previous)
+
+
+class BatchedPath:
+    # runner.run_rounds: every round of a block drawn and reduced at once, so only the whole round is timed
+    name = "batched"
+
+    def __init__(self, n, weight_genetic, k, rng, dtype=np.float64):
+        self.n = n
+        self.weight_genetic = weight_genetic
+        self.k = k
+        self.rng = rng
+        self.dtype = dtype
+
+    def generate(self):
+        self.population = Population.generate(self.n, self.weight_genetic, self.rng, self.dtype)
+        self.round_statistics = RoundStatistics()
+
+    def run(self, rounds):
+        run_rounds(self.population, rounds, self.weight_genetic, self.k, rng=self.rng, statistics=self.round_statistics)
+
+
+PATHS = {path.name: path for path in (ObjectPath, VectorizedPath, BatchedPath)}
+
+
+def make_rng(path, seed, bit_generator=None, dtype=np.float64):
+    # The object path draws one scalar at a time and always uses a plain Generator; the array paths
+    # can run on a RandomSource with any of its bit generators, which also draws float32 natively
+    if path is ObjectPath or (bit_generator is None and dtype == np.float64):
+        return np.random.default_rng(seed)
+    return RandomSource(seed, bit_generator or "pcg64", dtype=dtype)
+
+
+def run_case(path, n, rounds, weight_genetic=0.5, k=5, seed=0, bit_generator=None, dtype=np.float64):
+    # Seconds spent in every phase; generate runs once, the other phases once per round
+    engine = path(n, weight_genetic, k, make_rng(path, seed, bit_generator, dtype), dtype)
+    seconds = {}
+    start = time.perf_counter()
+    engine.generate()
+    seconds["generate"] = time.perf_counter() - start
+
+    if isinstance(engine, BatchedPath):
+        start = time.perf_counter()
+        engine.run(rounds)
+        seconds["rounds"] = time.perf_counter() - start
+        return seconds
+
+    phases = PHASES[1:]
+    for phase in phases:
+        seconds[phase] = 0.0
+    for _ in range(rounds):
+        for phase in phases:
+            start = time.perf_counter()
+            getattr(engine, phase)()
+            seconds[phase] += time.perf_counter() - start
+    seconds["rounds"] = sum(seconds[phase] for phase in phases)
+    return seconds
+
+
+def peak_memory(path, n, weight_genetic=0.5, k=5, seed=0, bit_generator=None, dtype=np.float64):
+    # Peak traced bytes above the starting point of each phase, over one round. numpy reports its
+    # buffers to tracemalloc, so this covers the arrays as well as the Python objects
+    engine = path(n, weight_genetic, k, make_rng(path, seed, bit_generator, dtype), dtype)
+    phases = ("generate", "rounds") if isinstance(engine, BatchedPath) else PHASES
+    peaks = {}
+    tracemalloc.start()
+    try:
+        for phase in phases:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            if phase == "rounds":
+                engine.run(1)
+            else:
+                getattr(engine, phase)()
+            peaks[phase] = tracemalloc.get_traced_memory()[1] - baseline
+        # Everything the engine keeps alive between rounds
+        peaks["resident"] = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    if "rounds" not in peaks:
+        peaks["rounds"] = max(peaks[phase] for phase in PHASES[1:])
+    return peaks
+
+
+def records(path, n, rounds, repeat=1, memory=True, weight_genetic=0.5, k=5, seed=0, bit_generator=None, dtype=np.float64):
+    # Best of `repeat` runs per phase, the usual way to keep scheduler noise out of a timing
+    runs = [run_case(path, n, rounds, weight_genetic, k, seed, bit_generator, dtype) for _ in range(repeat)]
+    peaks = peak_memory(path, n, weight_genetic, k, seed, bit_generator, dtype) if memory else {}
+    for phase in runs[0]:
+        seconds = min(run[phase] for run in runs)
+        count = 1 if phase == "generate" else rounds
+        yield {
+            "record": "result",
+            "path": path.name,
+            "bit_generator": bit_generator if path is not ObjectPath else None,
+            "dtype": np.dtype(dtype).name if path is not ObjectPath else None,
+            "phase": phase,
+            "n": n,
+            "rounds": count,
+            "seconds": seconds,
+            "individuals_per_second": n * count / seconds if seconds else None,
+            "rounds_per_second": count / seconds if seconds and phase != "generate" else None,
+            "peak_bytes": peaks.get(phase),
+            "resident_bytes": peaks.get("resident"),
+        }
+
+
+def environment():
+    return {
+        "record": "environment",
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def key(record):
+    return record["path"], record.get("bit_generator"), record.get("dtype"), record["phase"], record["n"], record["rounds"]
+
+
+def compare(results, baseline_file, tolerance):
+    # Cases that got slower than the baseline by more than `tolerance` (0.2 = 20%)
+    with open(baseline_file) as f:
+        baseline = {key(record): record for record in map(json.loads, f) if record.get("record") == "result"}
+    slower = []
+    for record in results:
+        before = baseline.get(key(record))
+        if before and before["seconds"] and record["seconds"] > before["seconds"] * (1 + tolerance):
+            slower.append((record, before))
+    return slower
+
+
+def sizes(value):
+    return [int(float(size)) for size in value.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark", description="Time the simulation phases across population sizes")
+    parser.add_argument("--paths", default=",".join(PATHS), help="comma separated: " + ", ".join(PATHS))
+    parser.add_argument("--sizes", type=sizes, default=sizes("1e2,1e3,1e4,1e5,1e6,1e7"))
+    parser.add_argument("--rounds", type=sizes, default=[1, 10], help="comma separated round counts")
+    parser.add_argument("--object-max", type=float, default=1e5, help="largest n run on the object path")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc pass")
+    parser.add_argument("--weight", type=float, default=0.5)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bit-generator", choices=sorted(BIT_GENERATORS), help="run the array paths on a RandomSource")
+    parser.add_argument("--dtypes", default="float64", help="comma separated precisions for the array paths, e.g. float64,float32")
+    parser.add_argument("--output", help="JSON lines file, default stdout")
+    parser.add_argument("--baseline", help="earlier output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against --baseline")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    results = []
+    try:
+        out.write(json.dumps(environment()) + "\n")
+        for name in args.paths.split(","):
+            path = PATHS[name]
+            for n in args.sizes:
+                if path is ObjectPath and n > args.object_max:
+                    continue
+                for rounds in args.rounds:
+                    # The object path has no dtype, so it runs once
+                    for dtype in (["float64"] if path is ObjectPath else args.dtypes.split(",")):
+                        for record in records(path, n, rounds, args.repeat, args.memory, args.weight, args.k, args.seed, args.bit_generator, np.dtype(dtype)):
+                            out.write(json.dumps(record) + "\n")
+                            out.flush()
+                            results.append(record)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    if args.baseline:
+        slower = compare(results, args.baseline, args.tolerance)
+        for record, before in slower:
+            print(f"slower: {record['path']} {record['phase']} n={record['n']} rounds={record['rounds']}: "
+                  f"{before['seconds']:.4g}s -> {record['seconds']:.4g}s", file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
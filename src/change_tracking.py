@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class ChangeTracker:
+    # Per-individual change between two rounds, for the whole population at once. Ids are aligned
+    # with array positions, so a round is one subtraction into a preallocated buffer, and every
+    # view (top/bottom k labels, mean change per starting decile, ...) is read from that buffer.
+    def __init__(self, ids, dtype=np.float64):
+        self.ids = np.asarray(ids)
+        n = len(self.ids)
+        self.previous = None
+        self.current = None
+        # Same dtype as the population's phenotypes, so a float32 population keeps float32 buffers
+        self.delta = np.empty(n, dtype=dtype)
+        self.scratch = np.empty(n, dtype=dtype)
+        # Sorted view of the ids, to map arbitrary ids back to positions in O(log n) each
+        self.id_order = np.argsort(self.ids, kind='stable')
+
+    def update(self, previous, current):
+        self.previous = previous
+        self.current = current
+        np.subtract(current, previous, out=self.delta)
+        return self.delta
+
+    def positions(self, ids):
+        return self.id_order[np.searchsorted(self.ids, ids, sorter=self.id_order)]
+
+    def changes(self, positions):
+        return self.delta[positions]
+
+    def labels(self, positions):
+        return ", ".join(f"ID {id}: {change:+.2f}" for id, change in zip(self.ids[positions], np.round(self.delta[positions], 2)))
+
+    def starting_buckets(self, buckets=10):
+        # Quantile bucket of every individual in the previous round, 0 = lowest. The cut values come
+        # from one in-place multi-pivot partition of a reused buffer, not from a full sort.
+        n = len(self.delta)
+        cuts = [n * b // buckets for b in range(1, buckets)]
+        if not cuts:
+            return np.zeros(n, dtype=np.intp)
+        np.copyto(self.scratch, self.previous)
+        self.scratch.partition(cuts)
+        return np.searchsorted(self.scratch[cuts], self.previous, side='right')
+
+    def mean_delta_by_bucket(self, buckets=10):
+        # E.g. the mean change of each starting decile: positive at the bottom, negative at the top
+        bucket = self.starting_buckets(buckets)
+        counts = np.bincount(bucket, minlength=buckets)
+        totals = np.bincount(bucket, weights=self.delta, minlength=buckets)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return totals / counts
+
+    def rank_change(self):
+        # Positive when an individual moved up. Needs a full sort of both rounds, so it is O(n log n)
+        # and only computed when asked for
+        n = len(self.delta)
+        previous_rank = np.empty(n, dtype=np.int64)
+        current_rank = np.empty(n, dtype=np.int64)
+        previous_rank[np.argsort(self.previous)] = np.arange(n)
+        current_rank[np.argsort(self.current)] = np.arange(n)
+        return current_rank - previous_rank
@@ -0,0 +1,185 @@
+import json
+import os
+import shutil
+import numpy as np
+from core import SimulationCore
+from population import Population
+from history import RoundHistory
+from online_stats import OnlineStats, OnlineCovariance, RoundStatistics
+from weight_sweep import WeightSweep
+from change_tracking import ChangeTracker
+from mobility import MobilityMatrix
+from random_source import RandomSource, as_source
+from instrumentation import PhaseTimer
+
+# Save and resume a SimulationCore exactly where it stopped. A checkpoint is a directory:
+#   checkpoint.json    the object graph, every number that is not in an array, and array offsets
+#   arrays.bin         every array, raw and C-ordered, each starting on a 64-byte boundary
+# Loading maps arrays.bin copy-on-write, so resuming a 1e8 population reads only the pages the next
+# rounds touch and never writes back into the checkpoint. The random streams are saved with their
+# buffered blocks, so a resumed run continues bit for bit as if it had never stopped.
+
+STATE = "checkpoint.json"
+ARRAYS = "arrays.bin"
+VERSION = 1
+ALIGNMENT = 64
+# The Tk apps resume from this directory when it holds a checkpoint, and save to it when closed
+SESSION_VARIABLE = "SIMULATION_CHECKPOINT"
+
+# Classes whose attributes are saved as they are
+CLASSES = {cls.__name__: cls for cls in (SimulationCore, Population, RoundHistory, OnlineStats, OnlineCovariance,
+                                         RoundStatistics, WeightSweep, ChangeTracker, MobilityMatrix)}
+# Working buffers: only their shape and dtype are saved, their contents never matter between rounds
+SCRATCH = {"scratch"}
+# The timer is the caller's, and the core's rng is saved on its own next to the core
+EXCLUDED = {"timer", "rng"}
+
+
+class Encoder:
+    # Turns the object graph into JSON plus a list of arrays. Shared objects and arrays (the tracker
+    # holding the population's phenotype, the sweep holding the population) are saved once and
+    # referenced, so they are shared again after loading
+    def __init__(self):
+        self.arrays = []
+        self.originals = []
+        self.offset = 0
+        self.seen = {}
+
+    def encode(self, value, name="state"):
+        if isinstance(value, (np.integer, np.bool_)):
+            return value.item()
+        if isinstance(value, np.floating):
+            return float(value)
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, (list, tuple)):
+            return [self.encode(item, f"{name}.{i}") for i, item in enumerate(value)]
+        if isinstance(value, dict):
+            return {"dict": {key: self.encode(item, f"{name}.{key}") for key, item in value.items()}}
+        if isinstance(value, np.dtype):
+            return {"dtype": value.str}
+        if id(value) in self.seen:
+            return {"ref": self.seen[id(value)]}
+        self.seen[id(value)] = name
+        if isinstance(value, np.ndarray):
+            return self.array(value, name)
+        if isinstance(value, RandomSource):
+            return {"random_source": self.encode(value.get_state(), name)}
+        if type(value).__name__ not in CLASSES:
+            raise TypeError(f"cannot checkpoint {type(value).__name__} at {name}")
+        fields = {}
+        for key, item in vars(value).items():
+            if key in EXCLUDED:
+                continue
+            if key in SCRATCH and isinstance(item, np.ndarray):
+                fields[key] = {"scratch": list(item.shape), "dtype": item.dtype.str}
+            else:
+                fields[key] = self.encode(item, f"{name}.{key}")
+        return {"object": type(value).__name__, "name": name, "fields": fields}
+
+    def array(self, value, name):
+        # Originals stay referenced until the file is written, so no id in self.seen is reused
+        self.originals.append(value)
+        value = np.ascontiguousarray(value)
+        self.offset += -self.offset % ALIGNMENT
+        self.arrays.append((self.offset, value))
+        record = {"array": name, "offset": self.offset, "shape": list(value.shape), "dtype": value.dtype.str}
+        self.offset += value.nbytes
+        return record
+
+
+class Decoder:
+    def __init__(self, path, mmap=True):
+        self.path = path
+        self.mmap = mmap
+        self.objects = {}
+
+    def decode(self, value, prefill=False):
+        if isinstance(value, list):
+            return [self.decode(item, prefill) for item in value]
+        if not isinstance(value, dict):
+            return value
+        if "dict" in value:
+            return {key: self.decode(item, prefill) for key, item in value["dict"].items()}
+        if "ref" in value:
+            return self.objects[value["ref"]]
+        if "array" in value:
+            array = self.array(value)
+            self.objects[value["array"]] = array
+            return array
+        if "dtype" in value:
+            return np.dtype(value["dtype"])
+        if "random_source" in value:
+            return RandomSource.from_state(self.decode(value["random_source"]), prefill)
+        cls = CLASSES[value["object"]]
+        instance = cls.__new__(cls)
+        self.objects[value["name"]] = instance
+        for key, item in value["fields"].items():
+            if isinstance(item, dict) and "scratch" in item:
+                setattr(instance, key, np.empty(item["scratch"], dtype=item["dtype"]))
+            else:
+                setattr(instance, key, self.decode(item, prefill))
+        return instance
+
+    def array(self, record):
+        dtype = np.dtype(record["dtype"])
+        shape = tuple(record["shape"])
+        if not self.mmap or int(np.prod(shape)) == 0:
+            with open(self.path, "rb") as f:
+                f.seek(record["offset"])
+                return np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+        # Copy-on-write: the simulation writes into these arrays, the file never changes
+        return np.memmap(self.path, dtype=dtype, mode="c", offset=record["offset"], shape=shape).view(np.ndarray)
+
+
+def save_checkpoint(core, directory):
+    # Written next to the target first, so an interrupted save never leaves a broken checkpoint behind
+    encoder = Encoder()
+    rng = as_source(core.rng)
+    state = {
+        "version": VERSION,
+        "core": encoder.encode(core, "core"),
+        # np.random and plain Generators are saved through the same state as a RandomSource
+        "rng": encoder.encode(rng.get_state(), "rng"),
+        "rng_wrapped": rng is not core.rng,
+    }
+    partial = directory.rstrip(os.sep) + ".partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    with open(os.path.join(partial, ARRAYS), "wb") as f:
+        for offset, array in encoder.arrays:
+            f.write(b"\0" * (offset - f.tell()))
+            array.tofile(f)
+    with open(os.path.join(partial, STATE), "w") as f:
+        json.dump(state, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(partial, directory)
+
+
+def load_checkpoint(directory, mmap=True, prefill=False, timer=None):
+    # The SimulationCore as it was saved, with a fresh timer unless one is given
+    with open(os.path.join(directory, STATE)) as f:
+        state = json.load(f)
+    if state.get("version") != VERSION:
+        raise ValueError(f"checkpoint version {state.get('version')} is not supported, expected {VERSION}")
+    decoder = Decoder(os.path.join(directory, ARRAYS), mmap)
+    core = decoder.decode(state["core"], prefill)
+    rng = RandomSource.from_state(decoder.decode(state["rng"]), prefill)
+    # A core that ran on np.random or a plain Generator gets that kind of generator back
+    core.rng = rng.intrinsic_generator if state["rng_wrapped"] else rng
+    core.timer = timer if timer is not None else PhaseTimer()
+    return core
+
+
+def resume_session(prefill=False, timer=None):
+    # The core a Tk app saved when it was last closed, or None to start a new session
+    directory = os.environ.get(SESSION_VARIABLE)
+    if directory and os.path.exists(os.path.join(directory, STATE)):
+        return load_checkpoint(directory, prefill=prefill, timer=timer)
+    return None
+
+
+def save_session(core):
+    directory = os.environ.get(SESSION_VARIABLE)
+    if directory:
+        save_checkpoint(core, directory)
@@ -0,0 +1,292 @@
+import argparse
+import json
+import sys
+
+# Headless entry point: python -m cli <command> from src/. Never imports tkinter, and numpy and the
+# simulation modules are only imported inside the command that needs them, so --help and argument
+# errors come back without paying for them.
+
+
+def random_options(args):
+    return {
+        "bit_generator": args.bit_generator,
+        "intrinsic_mean": args.intrinsic_mean,
+        "intrinsic_sd": args.intrinsic_sd,
+        "extrinsic_mean": args.extrinsic_mean,
+        "extrinsic_sd": args.extrinsic_sd,
+    }
+
+
+def rng_for(args):
+    from random_source import RandomSource
+    return RandomSource(args.seed, prefill=args.prefill, dtype=args.dtype, **random_options(args))
+
+
+def emit(record, out=sys.stdout):
+    # Strict JSON lines: undefined statistics are written as null, never as a bare NaN
+    from online_stats import defined
+    out.write(json.dumps(defined(record), allow_nan=False) + "\n")
+
+
+def simulate(args):
+    # Round by round through the same SimulationCore the GUIs use, one JSON line per round
+    from core import SimulationCore
+    from instrumentation import PhaseTimer
+    timer = PhaseTimer(log=open(args.timing, "a", buffering=1) if args.timing else None)
+    if args.resume:
+        # Population, history, statistics and random streams all come from the checkpoint
+        from checkpoint import load_checkpoint
+        core = load_checkpoint(args.resume, prefill=args.prefill, timer=timer)
+    else:
+        core = SimulationCore(args.n, args.weight, args.k, args.history_depth, rng_for(args), timer, args.dtype, args.quantiles or 5)
+    if args.checkpoint:
+        from checkpoint import save_checkpoint
+    try:
+        emit(core.summary())
+        for r in range(1, args.rounds + 1):
+            core.reshuffle()
+            emit(core.summary())
+            if args.checkpoint and args.checkpoint_every and r % args.checkpoint_every == 0:
+                save_checkpoint(core, args.checkpoint)
+        if args.checkpoint:
+            save_checkpoint(core, args.checkpoint)
+        if args.quantiles:
+            emit({"mobility": core.mobility.summary()})
+    finally:
+        timer.close()
+        core.rng.close()
+
+
+def config_for(args):
+    return {
+        "seed": args.seed,
+        "n": args.n,
+        "weight_genetic": args.weight,
+        "rounds": args.rounds,
+        "k": args.k,
+        "dtype": args.dtype,
+        "quantiles": args.quantiles,
+        **random_options(args),
+    }
+
+
+def run(args):
+    # Batched rounds for large n or many rounds; one summary line, or one line per round with --per-round
+    from runner import run_config
+    config = config_for(args)
+    # Unseeded runs are different every time, so only seeded ones go through the cache
+    if args.cache and not args.output and args.seed is not None:
+        from result_cache import ResultCache, cached_run
+        summary, arrays = cached_run(config, ResultCache(args.cache, disk_bytes=int(args.cache_bytes)), prefill=args.prefill)
+    else:
+        writer = None
+        if args.output:
+            from round_store import RoundWriter
+            writer = RoundWriter(args.output, args.n, dtype=args.dtype)
+        try:
+            summary, arrays = run_config(config, writer, prefill=args.prefill)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    if args.per_round:
+        for r in range(args.rounds):
+            emit({
+                "round": r + 1,
+                "mean": float(arrays["mean"][r]),
+                "std": float(arrays["std"][r]),
+                "top_ids": arrays["top_ids"][r].tolist(),
+                "bottom_ids": arrays["bottom_ids"][r].tolist(),
+                "previous_top_changes": arrays["previous_top_changes"][r].tolist(),
+                "previous_bottom_changes": arrays["previous_bottom_changes"][r].tolist(),
+            })
+    emit(summary)
+
+
+def generations(args):
+    # One JSON line per generation of offspring, then the last generation's summary
+    from population import Population
+    from generations import run_generations
+    rng = rng_for(args)
+    try:
+        population = Population.generate(args.n, args.weight, rng, args.dtype)
+        population, summaries = run_generations(population, args.generations, args.weight, args.assortment, args.segregation_sd, args.k, rng)
+    finally:
+        rng.close()
+    for g in range(len(summaries)):
+        emit({
+            "generation": g + 1,
+            "mean": float(summaries.mean[g]),
+            "std": float(summaries.std[g]),
+            "intrinsic_mean": float(summaries.intrinsic_mean[g]),
+            "intrinsic_std": float(summaries.intrinsic_std[g]),
+            "mate_correlation": float(summaries.mate_correlation[g]),
+            "midparent_slope": float(summaries.midparent_slope[g]),
+            "top_decile_regression": float(summaries.top_decile_regression[g]),
+            "bottom_decile_regression": float(summaries.bottom_decile_regression[g]),
+            "top_ids": summaries.top_ids[g].tolist(),
+            "bottom_ids": summaries.bottom_ids[g].tolist(),
+        })
+
+
+def replicates(args):
+    from replicates import run_replicates
+    results = run_replicates(args.replicates, args.n, args.weight, args.rounds, args.k, args.seed, args.workers,
+                             random_options=random_options(args))
+    emit({field: {"mean": mean, "sem": sem} for field, (mean, sem) in results.summary().items()})
+
+
+def sharded(args):
+    # Same rounds as simulate, with the population in shared memory and one worker per shard
+    from sharded import ShardedPopulation
+    with ShardedPopulation(args.n, args.weight, args.k, args.shards, args.seed, args.dtype, random_options(args)) as population:
+        emit(population.summary())
+        for _ in range(args.rounds):
+            population.reshuffle()
+            emit(population.summary())
+
+
+def serve(args):
+    # One engine for every connected viewer; see server.py for the protocol
+    import asyncio
+    from core import SimulationCore
+    from server import SimulationServer
+    core = SimulationCore(args.n, args.weight, args.k, args.history_depth, rng_for(args), dtype=args.dtype)
+    server = SimulationServer(core, args.host, args.port)
+    print(f"serving on {args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        core.rng.close()
+
+
+def sweep(args):
+    # A tidy CSV over the grid; rerunning the same command after an interruption picks up where it stopped
+    from grid_sweep import run_sweep
+    grid = {"n": args.sizes, "weight": args.weights, "extrinsic_sd": args.extrinsic_sds, "rounds": args.rounds, "k": args.ks}
+
+    def report(finished, total):
+        print(f"{finished}/{total} jobs", file=sys.stderr)
+
+    run_sweep(grid, args.output, args.seed, args.workers, args.progress, args.cache, report)
+
+
+def values(text):
+    # Comma separated numbers, or start:stop:step with stop included, e.g. 0:100:10
+    result = []
+    for part in text.split(","):
+        if ":" in part:
+            start, stop, step = (float(number) for number in part.split(":"))
+            count = int(round((stop - start) / step)) + 1
+            result.extend(start + i * step for i in range(count))
+        else:
+            result.append(float(part))
+    return result
+
+
+def quantiles(value):
+    from mobility import bucket_count
+    try:
+        return bucket_count(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def fraction(value):
+    value = float(value)
+    if not 0 <= value <= 1:
+        raise argparse.ArgumentTypeError("must be between 0 and 1")
+    return value
+
+
+def history_depth(value):
+    value = int(value)
+    if value < 2:
+        raise argparse.ArgumentTypeError("must be at least 2, the current round and the previous one")
+    return value
+
+
+def parents(value):
+    value = int(value)
+    if value < 2:
+        raise argparse.ArgumentTypeError("must be at least 2, one couple")
+    return value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli", description="Regression to the mean simulation, without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def command(name, function, help, size=int):
+        sub = commands.add_parser(name, help=help)
+        sub.add_argument("--n", type=size, default=100, help="population size")
+        sub.add_argument("--weight", type=fraction, default=0.5, help="genetic weight, 0-1")
+        sub.add_argument("--k", type=int, default=5, help="size of the top/bottom selections")
+        sub.add_argument("--rounds", type=int, default=10, help="environment reshuffles")
+        sub.add_argument("--seed", type=int, default=None)
+        sub.add_argument("--bit-generator", choices=("pcg64", "philox", "sfc64"), default="pcg64")
+        sub.add_argument("--intrinsic-mean", type=float, default=100.0)
+        sub.add_argument("--intrinsic-sd", type=float, default=10.0)
+        sub.add_argument("--extrinsic-mean", type=float, default=100.0)
+        sub.add_argument("--extrinsic-sd", type=float, default=10.0)
+        sub.add_argument("--prefill", action="store_true", help="draw the next environment block on a background thread")
+        sub.add_argument("--dtype", choices=("float64", "float32"), default="float64", help="precision of the population arrays")
+        sub.set_defaults(function=function)
+        return sub
+
+    sub = command("simulate", simulate, "step a SimulationCore and print every round")
+    sub.add_argument("--history-depth", type=history_depth, default=10)
+    sub.add_argument("--timing", help="append per-phase timings to this file as JSON lines")
+    sub.add_argument("--quantiles", type=quantiles, help="print the quantile transition matrix at the end: quintiles, deciles, percentiles or a number")
+    sub.add_argument("--checkpoint", help="save the full simulation state to this directory at the end")
+    sub.add_argument("--checkpoint-every", type=int, default=0, help="also save it every this many rounds")
+    sub.add_argument("--resume", help="continue from a checkpoint directory instead of a new population")
+
+    sub = command("run", run, "batched rounds, summary statistics only")
+    sub.add_argument("--output", help="directory to stream every round to (round_store format)")
+    sub.add_argument("--per-round", action="store_true", help="also print one line per round")
+    sub.add_argument("--quantiles", type=quantiles, help="accumulate a quantile transition matrix: quintiles, deciles, percentiles or a number")
+    sub.add_argument("--cache", help="result cache directory; a configuration already run there is not run again")
+    sub.add_argument("--cache-bytes", type=float, default=4e9, help="size limit of the on-disk cache")
+
+    sub = command("generations", generations, "parents to offspring, Galton's regression across generations", parents)
+    sub.add_argument("--generations", type=int, default=10)
+    sub.add_argument("--assortment", type=fraction, default=0.0, help="phenotypic correlation between mates, 0-1")
+    sub.add_argument("--segregation-sd", type=float, default=None, help="default keeps the genetic variance stable")
+
+    sub = command("replicates", replicates, "independent replicates, mean and standard error")
+    sub.add_argument("--replicates", type=int, default=100)
+    sub.add_argument("--workers", type=int, default=None, help="worker processes, default one per CPU")
+
+    sub = command("serve", serve, "share one simulation with many clients over TCP, JSON lines")
+    sub.add_argument("--host", default="127.0.0.1")
+    sub.add_argument("--port", type=int, default=8765)
+    sub.add_argument("--history-depth", type=history_depth, default=10)
+
+    sub = commands.add_parser("sweep", help="parameter grid on a process pool, resumable, one results table")
+    sub.add_argument("--sizes", type=values, default=[1000], help="population sizes, e.g. 1e3,1e4")
+    sub.add_argument("--weights", type=values, default=values("0:100:10"), help="genetic weights on the slider's 0-100 scale")
+    sub.add_argument("--extrinsic-sds", type=values, default=[10.0])
+    sub.add_argument("--rounds", type=values, default=[10])
+    sub.add_argument("--ks", type=values, default=[5], help="sizes of the top/bottom selections")
+    sub.add_argument("--seed", type=int, default=0)
+    sub.add_argument("--workers", type=int, default=None, help="worker processes, default one per CPU")
+    sub.add_argument("--output", default="sweep.csv")
+    sub.add_argument("--progress", help="progress file, default <output>.progress.jsonl")
+    sub.add_argument("--cache", help="result cache directory shared by the workers")
+    sub.set_defaults(function=sweep)
+
+    sub = command("sharded", sharded, "one population split across worker processes in shared memory")
+    sub.add_argument("--shards", type=int, default=None, help="worker processes, default one per CPU")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
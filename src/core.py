@@ -0,0 +1,121 @@
+import numpy as np
+from population import Population
+from selection import top_bottom_k
+from online_stats import RoundStatistics
+from weight_sweep import WeightSweep
+from change_tracking import ChangeTracker
+from history import RoundHistory
+from instrumentation import PhaseTimer
+from mobility import MobilityMatrix
+
+# The simulation state shared by every front-end. Nothing here imports tkinter: the Tk apps are
+# views over a SimulationCore, and headless code (cli.py) drives the same object directly.
+# weight_genetic is always a fraction between 0 and 1; sliders running 0-100 divide by 100.
+
+
+class SimulationCore:
+    def __init__(self, n=100, weight_genetic=0.5, k=5, history_depth=10, rng=np.random, timer=None, dtype=np.float64, quantiles=5):
+        self.n = n
+        self.k = k
+        self.weight_genetic = weight_genetic
+        self.round = 1
+        self.rng = rng
+        # Every phase of a round is timed; the apps add their own Tk phases to the same timer
+        self.timer = timer if timer is not None else PhaseTimer()
+
+        self.population = Population.generate(n, weight_genetic, rng, dtype)
+        self.history = RoundHistory(n, history_depth, dtype)
+        self.history.record(self.population, weight_genetic)
+        self.statistics = RoundStatistics()
+        self.statistics.add_round(self.population.phenotype)
+        self.sweep = WeightSweep(self.population)
+        self.tracker = ChangeTracker(self.population.id, dtype)
+        # Quantile transitions between consecutive rounds, and the weight the stored ranking is at
+        self.mobility = MobilityMatrix(quantiles)
+        self.mobility.rebucket(self.population.phenotype)
+        self.mobility_weight = weight_genetic
+
+        # Top/bottom k of the current round, and of the round before it once there is one
+        self.previous_top_positions = None
+        self.previous_bottom_positions = None
+        self.select()
+
+    def select(self, positions=None):
+        if positions is None:
+            positions = top_bottom_k(self.population.phenotype, self.k)
+        self.top_positions, self.bottom_positions = positions
+        self.top_ids = self.population.id[self.top_positions]
+        self.bottom_ids = self.population.id[self.bottom_positions]
+
+    def weight_scores(self, weight_genetic):
+        # Pure computation for a new weight; safe to run off the GUI thread
+        with self.timer.phase("weight_scores"):
+            scores = self.population.scores_at(weight_genetic)
+        with self.timer.phase("weight_select"):
+            positions = top_bottom_k(scores[2], self.k)
+        return weight_genetic, scores, positions
+
+    def apply_weight_scores(self, result):
+        weight_genetic, scores, positions = result
+        with self.timer.phase("weight_apply"):
+            self.weight_genetic = weight_genetic
+            self.population.set_scores(*scores)
+            # Summary statistics for the new weight come from the cached moments, not the individuals
+            self.statistics.set_current_moments(self.n, self.sweep.mean(weight_genetic), self.sweep.variance(weight_genetic))
+            self.select(positions)
+
+    def set_weight(self, weight_genetic):
+        self.apply_weight_scores(self.weight_scores(weight_genetic))
+
+    def reshuffle(self, weight_genetic=None):
+        # weight_genetic lets a GUI pass the latest slider position when its own update was cancelled
+        if weight_genetic is not None:
+            self.weight_genetic = weight_genetic
+        self.previous_top_positions = self.top_positions
+        self.previous_bottom_positions = self.bottom_positions
+
+        timer = self.timer
+        with timer.phase("environment", round=self.round):
+            self.population.reshuffle_environment(self.rng)
+        with timer.phase("phenotype", round=self.round):
+            self.population.calculate_phenotype(self.weight_genetic)
+        # Advancing the history is one slot fill, the previous round stays available as lag 1
+        with timer.phase("history", round=self.round):
+            self.history.record(self.population, self.weight_genetic)
+        # The previous round is reweighted to the current weight, so after a slider move every
+        # cross-round comparison is environmental only
+        previous = self.history.phenotype_at(1, self.population.intrinsic_value, self.weight_genetic)
+        with timer.phase("statistics", round=self.round):
+            self.statistics.add_round(self.population.phenotype, previous)
+            self.sweep.refresh()
+        with timer.phase("changes", round=self.round):
+            self.tracker.update(previous, self.population.phenotype)
+        # After a slider move the stored ranking is at the old weight; rank the reweighted round instead
+        with timer.phase("mobility", round=self.round):
+            self.mobility.update(self.population.phenotype, previous if self.weight_genetic != self.mobility_weight else None)
+            self.mobility_weight = self.weight_genetic
+        with timer.phase("select", round=self.round):
+            self.select()
+        self.round += 1
+
+    def has_changes(self):
+        return self.previous_top_positions is not None
+
+    def summary(self):
+        # Compact, JSON-friendly view of the current round
+        summary = {
+            "round": self.round,
+            "n": self.n,
+            "weight_genetic": float(self.weight_genetic),
+            "mean": self.statistics.current.mean,
+            "std": self.statistics.current.std,
+            "top_ids": self.top_ids.tolist(),
+            "bottom_ids": self.bottom_ids.tolist(),
+        }
+        if self.has_changes():
+            summary["previous_top_changes"] = self.tracker.changes(self.previous_top_positions).tolist()
+            summary["previous_bottom_changes"] = self.tracker.changes(self.previous_bottom_positions).tolist()
+            summary["correlation"] = self.statistics.cross_round.correlation
+            summary["slope"] = self.statistics.cross_round.slope
+            summary["mobility_index"] = self.mobility.mobility_index()
+        return summary
@@ -0,0 +1,117 @@
+import numpy as np
+from population import Population
+from random_source import as_source
+from selection import top_bottom_k, quantile_band
+from online_stats import OnlineStats, OnlineCovariance
+
+# Galton-style regression across generations. Every generation is paired into couples, each couple
+# has two children (one extra child from a random couple when n is odd, so n stays fixed), and a
+# child's intrinsic value is the mid-parent intrinsic value plus segregation noise. The extrinsic
+# value of every child is a fresh environment draw. Pairing, inheritance and scoring are whole-array
+# operations, so a generation of 1e7 costs a few sorts and gathers.
+
+
+class GenerationSummaries:
+    def __init__(self, generations, k):
+        self.mean = np.empty(generations)
+        self.std = np.empty(generations)
+        self.intrinsic_mean = np.empty(generations)
+        self.intrinsic_std = np.empty(generations)
+        # Realized phenotypic correlation between mates
+        self.mate_correlation = np.empty(generations)
+        # Slope of offspring on mid-parent phenotype, Galton's regression coefficient
+        self.midparent_slope = np.empty(generations)
+        # Offspring deviation from the mean as a fraction of their mid-parents' deviation, for the
+        # top and bottom decile of mid-parents: below 1 is regression toward the mean
+        self.top_decile_regression = np.empty(generations)
+        self.bottom_decile_regression = np.empty(generations)
+        self.top_ids = np.empty((generations, k), dtype=np.int64)
+        self.bottom_ids = np.empty((generations, k), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.mean)
+
+
+def pair_parents(phenotype, assortment, source):
+    # Positions of the two parents of every couple. A random half is matched to the other half by
+    # rank of a noisy phenotype score; assortment is the target phenotypic correlation between mates,
+    # 0 for random mating and 1 for mating strictly by phenotype
+    n = len(phenotype)
+    half = n // 2
+    order = source.permutation(n)
+    first = order[:half]
+    second = order[half:2 * half]
+    if assortment > 0:
+        # Scores only need to rank, so they stay in the population's dtype
+        score = source.intrinsic_noise(n, np.sqrt(1 - assortment))
+        z = np.subtract(phenotype, phenotype.mean(dtype=np.float64), dtype=np.float64)
+        z *= np.sqrt(assortment) / (z.std() or 1.0)
+        score += z
+        first = first[np.argsort(score[first])]
+        second = second[np.argsort(score[second])]
+    return first, second
+
+
+def next_generation(population, weight_genetic, first, second, source, segregation_sd, next_id):
+    # Offspring population and, for every child, the index of its couple
+    n = len(population)
+    couples = np.repeat(np.arange(len(first)), 2)
+    if len(couples) < n:
+        couples = np.concatenate([couples, source.permutation(len(first))[:n - len(couples)]])
+    mothers = first[couples]
+    fathers = second[couples]
+
+    intrinsic_value = population.intrinsic_value[mothers]
+    intrinsic_value += population.intrinsic_value[fathers]
+    intrinsic_value *= 0.5
+    intrinsic_value += source.intrinsic_noise(n, segregation_sd)
+    extrinsic_value = source.extrinsic(n)
+    children = Population(np.arange(next_id, next_id + n), intrinsic_value, extrinsic_value, weight_genetic, population.dtype)
+    return children, mothers, fathers
+
+
+def run_generations(population, generations, weight_genetic, assortment=0.0, segregation_sd=None, k=5, rng=np.random):
+    # Returns the last generation and one summary row per generation of offspring
+    if not 0 <= assortment <= 1:
+        raise ValueError("assortment must be between 0 and 1")
+    if len(population) < 2:
+        raise ValueError("a generation needs at least 2 individuals, one couple")
+    source = as_source(rng)
+    if segregation_sd is None:
+        # Half the genetic variance is lost by averaging two parents and restored by segregation,
+        # which keeps the genetic variance stable under random mating
+        segregation_sd = float(np.std(population.intrinsic_value, dtype=np.float64)) / np.sqrt(2)
+    # Every generation has as many children as parents, and top_bottom_k never returns more than that
+    k = min(k, len(population))
+    summaries = GenerationSummaries(generations, k)
+    next_id = int(population.id.max()) + 1 if len(population) else 1
+
+    for generation in range(generations):
+        first, second = pair_parents(population.phenotype, assortment, source)
+        mates = OnlineCovariance().update(population.phenotype[first], population.phenotype[second])
+        children, mothers, fathers = next_generation(population, weight_genetic, first, second, source, segregation_sd, next_id)
+        next_id += len(children)
+
+        midparent = population.phenotype[mothers]
+        midparent += population.phenotype[fathers]
+        midparent *= 0.5
+        inheritance = OnlineCovariance().update(midparent, children.phenotype)
+        parent_mean = inheritance.x.mean
+        child_mean = inheritance.y.mean
+        for band, row in (((0.9, 1.0), summaries.top_decile_regression), ((0.0, 0.1), summaries.bottom_decile_regression)):
+            positions = quantile_band(midparent, *band)
+            deviation = midparent[positions].mean(dtype=np.float64) - parent_mean if len(positions) else np.nan
+            row[generation] = (children.phenotype[positions].mean(dtype=np.float64) - child_mean) / deviation if deviation else np.nan
+
+        summaries.mean[generation] = child_mean
+        summaries.std[generation] = inheritance.y.std
+        intrinsic = OnlineStats().update(children.intrinsic_value)
+        summaries.intrinsic_mean[generation] = intrinsic.mean
+        summaries.intrinsic_std[generation] = intrinsic.std
+        summaries.mate_correlation[generation] = mates.correlation
+        summaries.midparent_slope[generation] = inheritance.slope
+        top, bottom = top_bottom_k(children.phenotype, k)
+        summaries.top_ids[generation] = children.id[top]
+        summaries.bottom_ids[generation] = children.id[bottom]
+        population = children
+    return population, summaries
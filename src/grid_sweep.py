@@ -0,0 +1,154 @@
+import csv
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from runner import run_config
+
+# Regression-to-the-mean results over a grid of configurations. The grid expands into jobs, cheap
+# jobs are packed into batches, and the batches go to a process pool most expensive first: every
+# idle worker takes the next batch from the pool's shared queue, so a slow batch never leaves the
+# other workers waiting. Every finished job is appended to a JSON lines progress file, which is
+# also how an interrupted sweep knows what is left. The tidy table (one row per job) is written
+# from the progress file at the end.
+
+# Grid axes and their defaults; weight is on the slider's 0-100 scale
+AXES = ("n", "weight", "extrinsic_sd", "rounds", "k")
+DEFAULT_GRID = {
+    "n": [1000],
+    "weight": list(range(0, 101, 10)),
+    "extrinsic_sd": [10.0],
+    "rounds": [10],
+    "k": [5],
+}
+TYPES = {"n": int, "weight": float, "extrinsic_sd": float, "rounds": int, "k": int}
+RESULTS = ("mean", "std", "correlation", "slope", "previous_top_change", "previous_bottom_change")
+
+# Jobs cheaper than this many individual-rounds share a batch, up to this much work per batch
+BATCH_COST = 2 * 10 ** 6
+
+
+def expand(grid):
+    # One parameter dict per grid point, in a fixed order
+    unknown = set(grid) - set(AXES)
+    if unknown:
+        raise ValueError(f"unknown grid axes: {', '.join(sorted(unknown))}")
+    grid = {**DEFAULT_GRID, **grid}
+    # Normalized types, so a job has the same key however the grid was written
+    grid = {axis: [TYPES[axis](value) for value in grid[axis]] for axis in AXES}
+    return [dict(zip(AXES, values)) for values in itertools.product(*(grid[axis] for axis in AXES))]
+
+
+def job_key(params):
+    return json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+
+def job_seed(seed, params):
+    # A job's seed depends on the sweep seed and its own parameters, not on its place in the grid,
+    # so adding points to a grid leaves the existing results unchanged
+    digest = hashlib.sha256(f"{seed}:{job_key(params)}".encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def job_config(params, seed):
+    return {
+        "seed": job_seed(seed, params),
+        "n": int(params["n"]),
+        "weight_genetic": params["weight"] / 100,
+        "rounds": int(params["rounds"]),
+        "k": int(params["k"]),
+        "extrinsic_sd": float(params["extrinsic_sd"]),
+    }
+
+
+def cost(params):
+    return params["n"] * (params["rounds"] + 1)
+
+
+def batches(jobs):
+    # Expensive jobs run alone, cheap ones are packed together; most expensive first
+    single = [[job] for job in jobs if cost(job) >= BATCH_COST]
+    packed = []
+    current, current_cost = [], 0
+    for job in sorted((job for job in jobs if cost(job) < BATCH_COST), key=cost, reverse=True):
+        if current and current_cost + cost(job) > BATCH_COST:
+            packed.append(current)
+            current, current_cost = [], 0
+        current.append(job)
+        current_cost += cost(job)
+    if current:
+        packed.append(current)
+    return sorted(single + packed, key=lambda batch: sum(map(cost, batch)), reverse=True)
+
+
+def run_batch(batch, seed, cache_directory=None):
+    # Runs in a worker process; returns one result row per job
+    cache = None
+    if cache_directory is not None:
+        from result_cache import ResultCache, cached_run
+        cache = ResultCache(cache_directory)
+    rows = []
+    for params in batch:
+        config = job_config(params, seed)
+        summary, _ = cached_run(config, cache) if cache is not None else run_config(config)
+        row = dict(params, seed=config["seed"])
+        row.update((field, summary[field]) for field in RESULTS)
+        rows.append(row)
+    return rows
+
+
+def read_progress(path):
+    # Finished rows by job key. A line cut short by an interrupted write is ignored
+    done = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                done[job_key({axis: row[axis] for axis in AXES})] = row
+    return done
+
+
+def write_table(path, jobs, done):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=AXES + ("seed",) + RESULTS)
+        writer.writeheader()
+        for params in jobs:
+            writer.writerow(done[job_key(params)])
+
+
+def run_sweep(grid, output, seed=0, workers=None, progress=None, cache_directory=None, report=None):
+    # Returns the number of jobs run now; the rest were already in the progress file
+    jobs = expand(grid)
+    progress = progress or output + ".progress.jsonl"
+    done = read_progress(progress)
+    todo = batches([params for params in jobs if job_key(params) not in done])
+
+    with open(progress, "a+") as f:
+        # A line cut short by an interruption gets its own line, so the next row is not glued to it
+        if f.tell() and (f.seek(f.tell() - 1), f.read(1))[1] != "\n":
+            f.write("\n")
+
+        def record(rows):
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+                done[job_key({axis: row[axis] for axis in AXES})] = row
+            f.flush()
+            if report is not None:
+                report(sum(job_key(params) in done for params in jobs), len(jobs))
+
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(todo) <= 1:
+            for batch in todo:
+                record(run_batch(batch, seed, cache_directory))
+        elif todo:
+            with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as executor:
+                futures = [executor.submit(run_batch, batch, seed, cache_directory) for batch in todo]
+                for future in as_completed(futures):
+                    record(future.result())
+
+    write_table(output, jobs, done)
+    return sum(len(batch) for batch in todo)
@@ -1,7 +1,12 @@
 import tkinter as tk
 from tkinter import ttk
-import numpy as np
-from individual import Individual
+from core import SimulationCore
+from virtual_table import VirtualTable
+from scheduler import RenderScheduler
+from instrumentation import PhaseTimer
+from random_source import RandomSource
+from histogram_panel import HistogramPanel
+from checkpoint import resume_session, save_session
 
 class SimulationApp:
     def __init__(self, root):
@@ -9,102 +14,107 @@ class SimulationApp:
         self.root.title("Regression to the Mean Simulation")
 
         self.n = 100
-        self.weight_genetic = 50
-        self.round = 1
-
-        # Generate initial population
-        self.population = self.generate_population(self.n)
-        self.previous_top_five = []
-        self.previous_bottom_five = []
-        self.top_five_ids = []
-        self.bottom_five_ids = []
+        self.k = 5  # Size of the top/bottom selections
+        self.weight_genetic = 0.5
+        self.history_depth = 10  # Rounds kept for lag comparisons
+
+        # Per-phase timings for the status bar, and a JSON lines log when SIMULATION_TIMING_LOG is set
+        self.timer = PhaseTimer.from_environment()
+
+        # All simulation state lives in the shared core, this class only renders it. With
+        # SIMULATION_CHECKPOINT set, the session saved there on close is picked up where it was left
+        self.core = resume_session(prefill=True, timer=self.timer)
+        if self.core is None:
+            # The next block of environment draws is prepared on a background thread while a round renders
+            self.random = RandomSource(prefill=True)
+            self.core = SimulationCore(self.n, self.weight_genetic, self.k, self.history_depth, self.random, timer=self.timer)
+        else:
+            self.random = self.core.rng
+            self.n, self.k, self.weight_genetic = self.core.n, self.core.k, self.core.weight_genetic
+
+        # Slider work runs on a background worker, results are applied on the Tk thread
+        self.scheduler = RenderScheduler(self.root, self.core.weight_scores, self.apply_weight)
 
         # Create UI components
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
         # Display initial phenotypes
-        self.update_phenotypes(self.population, self.weight_genetic)
         self.display_table()
-        self.update_top_bottom_five()
+        self.update_histogram()
+        self.update_top_bottom()
         self.update_statistics()
 
-    def generate_population(self, n):
-        population = []
-        for i in range(1, n + 1):
-            intrinsic_value = np.random.normal(100, 10)
-            extrinsic_value = np.random.normal(100, 10)
-            population.append(Individual(i, intrinsic_value, extrinsic_value))
-        return population
-
-    def update_phenotypes(self, population, weight_genetic):
-        for individual in population:
-            individual.phenotype = individual.calculate_phenotype(weight_genetic)
-
     def reshuffle_environment(self):
-        previous_population = [Individual(ind.id, ind.intrinsic_value, ind.extrinsic_value) for ind in self.population]
-        for individual in self.population:
-            individual.extrinsic_value = np.random.normal(100, 10)
-        self.update_phenotypes(self.population, self.weight_genetic)
-        self.display_table()
-        self.track_changes(previous_population)
-        self.update_top_bottom_five()
-        self.update_statistics()
-        self.round += 1
+        # Any slider result still in flight was computed for the old environment
+        self.scheduler.cancel()
+        with self.timer.phase("reshuffle_environment"):
+            self.core.reshuffle(self.weight_genetic)
+            with self.timer.phase("display_table"):
+                self.display_table()
+            with self.timer.phase("histogram"):
+                self.update_histogram()
+            with self.timer.phase("top_bottom_tables"):
+                self.update_top_bottom()
+            with self.timer.phase("change_labels"):
+                self.track_changes()
+            with self.timer.phase("statistics_label"):
+                self.update_statistics()
+        self.update_status()
 
     def display_table(self):
-        for i, individual in enumerate(self.population):
-            self.table.item(self.table.get_children()[i], values=(individual.id, f"{individual.phenotype:.2f}"))
+        # Only the rows currently scrolled into view are pushed to Tk
+        population = self.core.population
+        self.table.set_data(population.id, population.phenotype)
 
-    def update_top_bottom_five(self):
-        sorted_population = sorted(self.population, key=lambda x: x.phenotype, reverse=True)
-        
-        self.top_five_ids = [ind.id for ind in sorted_population[:5]]
-        self.bottom_five_ids = [ind.id for ind in sorted_population[-5:]]
+    def update_histogram(self):
+        # Only the bars whose height changed are redrawn
+        population = self.core.population
+        self.histogram.update(population.phenotype, population.genetic_score, population.environmental_score)
 
-        self.previous_top_five = [ind for ind in self.population if ind.id in self.top_five_ids]
-        self.previous_bottom_five = [ind for ind in self.population if ind.id in self.bottom_five_ids]
+    def update_top_bottom(self):
+        core = self.core
+        # Only the handful of selected rows are materialized as Individuals
+        self.previous_top = core.population.rows(core.top_positions)
+        self.previous_bottom = core.population.rows(core.bottom_positions)
 
         self.update_top_bottom_tables()
 
     def update_top_bottom_tables(self):
-        for i, individual in enumerate(self.previous_top_five):
-            self.top_five_table.item(self.top_five_table.get_children()[i], values=(individual.id, f"{individual.phenotype:.2f}"))
-        for i, individual in enumerate(self.previous_bottom_five):
-            self.bottom_five_table.item(self.bottom_five_table.get_children()[i], values=(individual.id, f"{individual.phenotype:.2f}"))
-
-    def track_changes(self, previous_population):
-        if self.round > 1:
-            previous_top_five_dict = {ind.id: ind.phenotype for ind in previous_population if ind.id in self.top_five_ids}
-            previous_bottom_five_dict = {ind.id: ind.phenotype for ind in previous_population if ind.id in self.bottom_five_ids}
-
-            top_five_changes = [(ind.id, round(ind.phenotype - previous_top_five_dict.get(ind.id, ind.phenotype), 2)) for ind in self.population if ind.id in self.top_five_ids]
-            bottom_five_changes = [(ind.id, round(ind.phenotype - previous_bottom_five_dict.get(ind.id, ind.phenotype), 2)) for ind in self.population if ind.id in self.bottom_five_ids]
+        for i, individual in enumerate(self.previous_top):
+            self.top_table.item(self.top_table.get_children()[i], values=(individual.id, f"{individual.phenotype:.2f}"))
+        for i, individual in enumerate(self.previous_bottom):
+            self.bottom_table.item(self.bottom_table.get_children()[i], values=(individual.id, f"{individual.phenotype:.2f}"))
 
-            new_top_five_changes = [(ind.id, round(ind.phenotype - previous_top_five_dict.get(ind.id, ind.phenotype), 2)) for ind in self.population if ind.id in self.top_five_ids]
-            new_bottom_five_changes = [(ind.id, round(ind.phenotype - previous_bottom_five_dict.get(ind.id, ind.phenotype), 2)) for ind in self.population if ind.id in self.bottom_five_ids]
+    def track_changes(self):
+        core = self.core
+        if core.has_changes():
+            # The core already did one vectorized pass over the whole population, the labels are just a view of it
+            prev_top_increases_str = core.tracker.labels(core.previous_top_positions)
+            prev_bottom_decreases_str = core.tracker.labels(core.previous_bottom_positions)
 
-            prev_top_increases_str = ", ".join([f"ID {id}: {change:+.2f}" for id, change in top_five_changes])
-            prev_bottom_decreases_str = ", ".join([f"ID {id}: {change:+.2f}" for id, change in bottom_five_changes])
+            new_top_increases_str = core.tracker.labels(core.top_positions)
+            new_bottom_decreases_str = core.tracker.labels(core.bottom_positions)
 
-            new_top_increases_str = ", ".join([f"ID {id}: {change:+.2f}" for id, change in new_top_five_changes])
-            new_bottom_decreases_str = ", ".join([f"ID {id}: {change:+.2f}" for id, change in new_bottom_five_changes])
+            self.top_increases_label.config(text=f"Previous Top {self.k} changes: {prev_top_increases_str}")
+            self.top_decreases_label.config(text=f"Previous Bottom {self.k} changes: {prev_bottom_decreases_str}")
 
-            self.top_increases_label.config(text=f"Previous Top 5 changes: {prev_top_increases_str}")
-            self.top_decreases_label.config(text=f"Previous Bottom 5 changes: {prev_bottom_decreases_str}")
-
-            self.new_top_increases_label.config(text=f"New Top 5 changes: {new_top_increases_str}")
-            self.new_bottom_decreases_label.config(text=f"New Bottom 5 changes: {new_bottom_decreases_str}")
+            self.new_top_increases_label.config(text=f"New Top {self.k} changes: {new_top_increases_str}")
+            self.new_bottom_decreases_label.config(text=f"New Bottom {self.k} changes: {new_bottom_decreases_str}")
 
     def update_statistics(self):
-        phenotypes = [ind.phenotype for ind in self.population]
-        mean = np.mean(phenotypes)
-        std_dev = np.std(phenotypes)
+        # Read from the running accumulators, nothing is recomputed here
+        mean = self.core.statistics.current.mean
+        std_dev = self.core.statistics.current.std
         self.statistics_label.config(text=f"Mean: {mean:.2f}, Std Dev: {std_dev:.2f}")
 
+    def update_status(self):
+        self.status_bar.config(text=self.timer.status())
+
     def create_widgets(self):
         # Slider for genetic weight
         self.slider = ttk.Scale(self.root, from_=0, to=100, orient='horizontal', command=self.slider_changed)
-        self.slider.set(self.weight_genetic)
+        self.slider.set(self.weight_genetic * 100)
         self.slider.pack(pady=10)
 
         # Button to reshuffle environment
@@ -113,56 +123,77 @@ class SimulationApp:
 
         # Table to display phenotypes
         columns = ("ID", "Phenotype")
-        self.table = ttk.Treeview(self.root, columns=columns, show='headings')
-        self.table.heading("ID", text="ID")
-        self.table.heading("Phenotype", text="Phenotype")
+        self.table = VirtualTable(self.root, columns, ("{}", "{:.2f}"), height=10)
         self.table.pack(pady=10)
 
-        for individual in self.population:
-            self.table.insert('', 'end', values=(individual.id, f"{individual.phenotype:.2f}"))
-
-        # New Top Five Table
-        self.top_five_label = ttk.Label(self.root, text="New Top Five")
-        self.top_five_label.pack(pady=5)
-        self.top_five_table = ttk.Treeview(self.root, columns=columns, show='headings')
-        self.top_five_table.heading("ID", text="ID")
-        self.top_five_table.heading("Phenotype", text="Phenotype")
-        self.top_five_table.pack(pady=10)
-        for _ in range(5):
-            self.top_five_table.insert('', 'end', values=("", ""))
-
-        # New Bottom Five Table
-        self.bottom_five_label = ttk.Label(self.root, text="New Bottom Five")
-        self.bottom_five_label.pack(pady=5)
-        self.bottom_five_table = ttk.Treeview(self.root, columns=columns, show='headings')
-        self.bottom_five_table.heading("ID", text="ID")
-        self.bottom_five_table.heading("Phenotype", text="Phenotype")
-        self.bottom_five_table.pack(pady=10)
-        for _ in range(5):
-            self.bottom_five_table.insert('', 'end', values=("", ""))
+        # New Top k Table
+        self.top_label = ttk.Label(self.root, text=f"New Top {self.k}")
+        self.top_label.pack(pady=5)
+        self.top_table = ttk.Treeview(self.root, columns=columns, show='headings')
+        self.top_table.heading("ID", text="ID")
+        self.top_table.heading("Phenotype", text="Phenotype")
+        self.top_table.pack(pady=10)
+        for _ in range(self.k):
+            self.top_table.insert('', 'end', values=("", ""))
+
+        # New Bottom k Table
+        self.bottom_label = ttk.Label(self.root, text=f"New Bottom {self.k}")
+        self.bottom_label.pack(pady=5)
+        self.bottom_table = ttk.Treeview(self.root, columns=columns, show='headings')
+        self.bottom_table.heading("ID", text="ID")
+        self.bottom_table.heading("Phenotype", text="Phenotype")
+        self.bottom_table.pack(pady=10)
+        for _ in range(self.k):
+            self.bottom_table.insert('', 'end', values=("", ""))
 
         # Labels to display changes
-        self.top_increases_label = ttk.Label(self.root, text="Previous Top 5 changes: ")
+        self.top_increases_label = ttk.Label(self.root, text=f"Previous Top {self.k} changes: ")
         self.top_increases_label.pack(pady=5)
 
-        self.top_decreases_label = ttk.Label(self.root, text="Previous Bottom 5 changes: ")
+        self.top_decreases_label = ttk.Label(self.root, text=f"Previous Bottom {self.k} changes: ")
         self.top_decreases_label.pack(pady=5)
 
-        self.new_top_increases_label = ttk.Label(self.root, text="New Top 5 changes: ")
+        self.new_top_increases_label = ttk.Label(self.root, text=f"New Top {self.k} changes: ")
         self.new_top_increases_label.pack(pady=5)
 
-        self.new_bottom_decreases_label = ttk.Label(self.root, text="New Bottom 5 changes: ")
+        self.new_bottom_decreases_label = ttk.Label(self.root, text=f"New Bottom {self.k} changes: ")
         self.new_bottom_decreases_label.pack(pady=5)
 
         # Label to display statistics
         self.statistics_label = ttk.Label(self.root, text="Mean: , Std Dev: ")
         self.statistics_label.pack(pady=5)
 
+        # Live phenotype distribution, with the genetic and environmental components as lines
+        self.histogram = HistogramPanel(self.root)
+        self.histogram.pack(pady=5)
+
+        # Status bar with the rolling per-phase timings
+        self.status_bar = ttk.Label(self.root, text="", relief='sunken', anchor='w')
+        self.status_bar.pack(side='bottom', fill='x')
+
     def slider_changed(self, event):
-        self.weight_genetic = int(self.slider.get())
-        self.update_phenotypes(self.population, self.weight_genetic)
-        self.display_table()
-        self.update_statistics()
+        # The slider runs 0-100, the core works with a 0-1 fraction
+        self.weight_genetic = self.slider.get() / 100.0
+        # Intermediate drag positions are coalesced, only the latest weight is computed
+        self.scheduler.submit(self.weight_genetic)
+
+    def apply_weight(self, result):
+        with self.timer.phase("apply_weight"):
+            self.core.apply_weight_scores(result)
+            with self.timer.phase("display_table"):
+                self.display_table()
+            with self.timer.phase("histogram"):
+                self.update_histogram()
+            with self.timer.phase("statistics_label"):
+                self.update_statistics()
+        self.update_status()
+
+    def close(self):
+        # Slider work still in flight is dropped first, so the saved session is the one on screen
+        self.scheduler.close()
+        save_session(self.core)
+        self.random.close()
+        self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
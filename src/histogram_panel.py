@@ -0,0 +1,127 @@
+import tkinter as tk
+import numpy as np
+
+# Fraction-per-bin levels the y axis snaps to; it only changes level when the tallest bar outgrows
+# the current one or drops below half of it, so most updates move a few bars and not the axis
+LEVELS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+
+def histogram(values, low, high, bins, offset=0.0, index=None, scratch=None):
+    # Counts of values + offset in `bins` equal bins over [low, high), values outside dropped. Equal
+    # bins make this one scale, one cast and one bincount, several times faster than np.histogram;
+    # index and scratch are reusable buffers of len(values)
+    n = len(values)
+    if scratch is None or len(scratch) != n:
+        scratch = np.empty(n, dtype=values.dtype)
+    if index is None or len(index) != n:
+        index = np.empty(n, dtype=np.intp)
+    # Shifting the range instead of the values keeps the offset free
+    np.subtract(values, low - offset, out=scratch)
+    scratch *= bins / (high - low)
+    # Everything below the range lands in the first extra bin, everything above in the last
+    np.clip(scratch, -1, bins, out=scratch)
+    np.floor(scratch, out=scratch)
+    np.copyto(index, scratch, casting='unsafe')
+    index += 1
+    return np.bincount(index, minlength=bins + 2)[1:bins + 1]
+
+
+class HistogramPanel:
+    # Live phenotype histogram on a Canvas. Every bar is one rectangle created up front; an update
+    # bins the whole population with histogram() and calls coords() only for the bars whose pixel
+    # height changed. The genetic and environmental components are drawn as step lines, each with
+    # the other component held at its mean, so they sit on the phenotype's scale: one coords() call
+    # per line.
+    def __init__(self, parent, bins=60, width=400, height=150, low=None, high=None, components=True):
+        self.bins = bins
+        self.width = width
+        self.height = height
+        self.low = low
+        self.high = high
+        self.components = components
+        self.level = None
+        self.index = None
+        self.scratch = None
+
+        self.canvas = tk.Canvas(parent, width=width, height=height, background='white', highlightthickness=0)
+        self.bar_width = width / bins
+        self.bars = [self.canvas.create_rectangle(i * self.bar_width, height, (i + 1) * self.bar_width, height,
+                                                  fill='steelblue', outline='') for i in range(bins)]
+        self.bar_heights = np.zeros(bins, dtype=np.intp)
+        self.lines = {}
+        self.line_heights = {}
+        if components:
+            for name, colour in (("genetic", "darkgreen"), ("environmental", "darkorange")):
+                self.lines[name] = self.canvas.create_line(0, height, width, height, fill=colour, width=2)
+                self.line_heights[name] = None
+        self.mean_line = self.canvas.create_line(0, 0, 0, height, fill='firebrick', dash=(3, 2))
+        self.range_label = self.canvas.create_text(4, 4, anchor='nw', text="", font="TkSmallFont")
+
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+
+    def grid(self, **kwargs):
+        self.canvas.grid(**kwargs)
+
+    def set_range(self, low, high):
+        self.low = low
+        self.high = high
+
+    def update(self, phenotype, genetic_score=None, environmental_score=None):
+        n = len(phenotype)
+        if n == 0:
+            return
+        mean = float(np.mean(phenotype, dtype=np.float64))
+        if self.low is None:
+            # Wide enough for the spread at any weight, fixed from then on so changes stay visible
+            spread = 5 * (float(np.std(phenotype, dtype=np.float64)) or 1.0)
+            self.set_range(mean - spread, mean + spread)
+        if self.index is None or len(self.index) != n:
+            self.index = np.empty(n, dtype=np.intp)
+        if self.scratch is None or len(self.scratch) != n or self.scratch.dtype != phenotype.dtype:
+            self.scratch = np.empty(n, dtype=phenotype.dtype)
+
+        series = {"phenotype": self.count(phenotype)}
+        if self.components and genetic_score is not None and environmental_score is not None:
+            series["genetic"] = self.count(genetic_score, float(np.mean(environmental_score, dtype=np.float64)))
+            series["environmental"] = self.count(environmental_score, float(np.mean(genetic_score, dtype=np.float64)))
+        tallest = max(counts.max() for counts in series.values()) / n
+        self.rescale(tallest)
+
+        scale = (self.height - 14) / (self.level * n)
+        heights = (series["phenotype"] * scale).astype(np.intp)
+        for i in np.flatnonzero(heights != self.bar_heights):
+            x = i * self.bar_width
+            self.canvas.coords(self.bars[i], x, self.height - heights[i], x + self.bar_width, self.height)
+        self.bar_heights = heights
+
+        for name, line in self.lines.items():
+            if name not in series:
+                continue
+            heights = (series[name] * scale).astype(np.intp)
+            if self.line_heights[name] is not None and np.array_equal(heights, self.line_heights[name]):
+                continue
+            self.line_heights[name] = heights
+            self.canvas.coords(line, *self.steps(heights))
+
+        x = (mean - self.low) / (self.high - self.low) * self.width
+        self.canvas.coords(self.mean_line, x, 0, x, self.height)
+
+    def count(self, values, offset=0.0):
+        return histogram(values, self.low, self.high, self.bins, offset, self.index, self.scratch)
+
+    def rescale(self, tallest):
+        level = next((level for level in LEVELS if tallest <= level), LEVELS[-1])
+        if self.level is None or level > self.level or level < self.level / 2:
+            self.level = level
+            # Every bar moves with the axis
+            self.bar_heights[:] = -1
+            for name in self.line_heights:
+                self.line_heights[name] = None
+            self.canvas.itemconfig(self.range_label, text=f"{self.low:.0f}-{self.high:.0f}, max {self.level:.0%} per bin")
+
+    def steps(self, heights):
+        # Flat coordinate list of a step line over the bins
+        x = np.repeat(np.arange(self.bins + 1) * self.bar_width, 2)[1:-1]
+        y = np.repeat(self.height - heights, 2)
+        return np.column_stack([x, y]).ravel().tolist()
@@ -0,0 +1,62 @@
+import numpy as np
+from individual import Individual
+
+
+class RoundHistory:
+    # The last `depth` rounds of environment and phenotype arrays in a preallocated ring buffer.
+    # Recording a round bumps the head and fills one slot; nothing is allocated or constructed,
+    # and any lag up to depth - 1 can be compared without re-simulating.
+    def __init__(self, n, depth=2, dtype=np.float64):
+        # Every comparison needs at least the previous round next to the current one
+        if depth < 2:
+            raise ValueError("history depth must be at least 2")
+        self.depth = depth
+        self.extrinsic_value = np.empty((depth, n), dtype=dtype)
+        self.phenotype = np.empty((depth, n), dtype=dtype)
+        self.weight_genetic = np.empty(depth)
+        self.head = -1
+        self.rounds = 0
+
+    def __len__(self):
+        return min(self.rounds, self.depth)
+
+    def record(self, population, weight_genetic):
+        self.head = (self.head + 1) % self.depth
+        self.extrinsic_value[self.head] = population.extrinsic_value
+        self.phenotype[self.head] = population.phenotype
+        self.weight_genetic[self.head] = weight_genetic
+        self.rounds += 1
+
+    def slot(self, lag):
+        # Lag 0 is the latest recorded round, lag 1 the one before it, and so on
+        if not 0 <= lag < len(self):
+            raise IndexError(f"lag {lag} is not kept, the history holds {len(self)} rounds")
+        return (self.head - lag) % self.depth
+
+    def extrinsic(self, lag):
+        return self.extrinsic_value[self.slot(lag)]
+
+    def phenotype_of(self, lag):
+        return self.phenotype[self.slot(lag)]
+
+    def phenotype_at(self, lag, intrinsic_value, weight_genetic):
+        # A past round's phenotype under another weight, e.g. the one the slider is at now
+        return intrinsic_value * weight_genetic + self.extrinsic(lag) * (1 - weight_genetic)
+
+    def compare(self, lag, recent=0):
+        # Per-individual change from round t - lag to round t - recent
+        return self.phenotype_of(recent) - self.phenotype_of(lag)
+
+    def correlation(self, lag, recent=0):
+        return np.corrcoef(self.phenotype_of(lag), self.phenotype_of(recent))[0, 1]
+
+    def rows(self, population, positions, lag=1):
+        # Individuals as they were `lag` rounds ago, built only for the requested positions
+        slot = self.slot(lag)
+        weight_genetic = self.weight_genetic[slot]
+        rows = []
+        for i in positions:
+            individual = Individual(population.id[i], population.intrinsic_value[i], self.extrinsic_value[slot, i])
+            individual.phenotype = individual.calculate_phenotype(weight_genetic)
+            rows.append(individual)
+        return rows
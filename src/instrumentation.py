@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Environment variable the apps read for an optional JSON lines timing log
+LOG_VARIABLE = "SIMULATION_TIMING_LOG"
+
+
+class PhaseTimer:
+    # Durations and counts per named phase. The last `window` durations of every phase are kept for a
+    # rolling breakdown, and every measurement can also go out as one JSON line for offline profiling.
+    # Phases may be recorded from the scheduler's worker thread, so updates take a lock.
+    def __init__(self, window=50, log=None):
+        self.window = window
+        self.durations = {}
+        self.counts = {}
+        self.totals = {}
+        self.log = log
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls, window=50):
+        path = os.environ.get(LOG_VARIABLE)
+        return cls(window, open(path, "a", buffering=1) if path else None)
+
+    @contextmanager
+    def phase(self, name, **fields):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **fields)
+
+    def record(self, name, seconds, **fields):
+        with self.lock:
+            if name not in self.durations:
+                self.durations[name] = deque(maxlen=self.window)
+                self.counts[name] = 0
+                self.totals[name] = 0.0
+            self.durations[name].append(seconds)
+            self.counts[name] += 1
+            self.totals[name] += seconds
+            if self.log is not None:
+                event = {"time": time.time(), "phase": name, "seconds": seconds, "thread": threading.current_thread().name}
+                event.update(fields)
+                self.log.write(json.dumps(event) + "\n")
+
+    def mean(self, name):
+        # Rolling mean over the last `window` measurements
+        with self.lock:
+            durations = self.durations.get(name)
+            return sum(durations) / len(durations) if durations else 0.0
+
+    def breakdown(self):
+        # (phase, rolling mean seconds, total count) in the order the phases were first seen
+        with self.lock:
+            return [(name, sum(durations) / len(durations), self.counts[name]) for name, durations in self.durations.items()]
+
+    def status(self, phases=None):
+        breakdown = self.breakdown()
+        if phases is not None:
+            breakdown = [row for row in breakdown if row[0] in phases]
+        return " | ".join(f"{name} {seconds * 1000:.2f} ms" for name, seconds, _ in breakdown)
+
+    def reset(self):
+        with self.lock:
+            self.durations.clear()
+            self.counts.clear()
+            self.totals.clear()
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
@@ -0,0 +1,93 @@
+import json
+import os
+import numpy as np
+from random_source import as_source
+from selection import top_k, bottom_k
+from online_stats import OnlineStats
+
+# Arrays kept on disk; ids are implicit (position + 1) and the genetic/environmental
+# scores are recomputed per chunk, so a 1e9 population needs 24 GB of disk, not 48
+FIELDS = ("intrinsic_value", "extrinsic_value", "phenotype")
+META = "population.json"
+
+# Values of RAM touched per individual while a chunk is processed: the fresh draw,
+# the two score temporaries and the phenotype being written
+WORKING_VALUES = 4
+
+
+class MemmapPopulation:
+    def __init__(self, directory, memory_budget=256 * 2 ** 20, mode="r+"):
+        with open(os.path.join(directory, META)) as f:
+            meta = json.load(f)
+        self.n = meta["n"]
+        # Populations written before the precision option are float64
+        self.dtype = np.dtype(meta.get("dtype", "float64"))
+        self.directory = directory
+        self.chunk_size = max(1, memory_budget // (WORKING_VALUES * self.dtype.itemsize))
+        for name in FIELDS:
+            setattr(self, name, np.memmap(os.path.join(directory, f"{name}.bin"), dtype=self.dtype, mode=mode, shape=(self.n,)))
+
+    @classmethod
+    def create(cls, directory, n, memory_budget=256 * 2 ** 20, weight_genetic=0.5, rng=np.random, dtype=np.float64):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, META), "w") as f:
+            json.dump({"n": n, "dtype": np.dtype(dtype).name}, f)
+        for name in FIELDS:
+            # Sparse files of the right size; the chunked passes below fill them in
+            with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+                f.truncate(n * np.dtype(dtype).itemsize)
+
+        population = cls(directory, memory_budget)
+        source = as_source(rng)
+        for start, stop in population.chunks():
+            population.intrinsic_value[start:stop] = source.intrinsic(stop - start)
+            source.extrinsic(stop - start, out=population.extrinsic_value[start:stop])
+        population.calculate_phenotype(weight_genetic)
+        return population
+
+    def __len__(self):
+        return self.n
+
+    def chunks(self):
+        for start in range(0, self.n, self.chunk_size):
+            yield start, min(start + self.chunk_size, self.n)
+
+    def ids(self, positions):
+        return np.asarray(positions) + 1
+
+    def scores(self, start, stop, weight_genetic):
+        # Genetic and environmental scores of one chunk, which are not stored
+        return self.intrinsic_value[start:stop] * weight_genetic, self.extrinsic_value[start:stop] * (1 - weight_genetic)
+
+    def calculate_phenotype(self, weight_genetic):
+        for start, stop in self.chunks():
+            genetic_score, environmental_score = self.scores(start, stop, weight_genetic)
+            np.add(genetic_score, environmental_score, out=self.phenotype[start:stop])
+
+    def reshuffle_environment(self, rng=np.random):
+        source = as_source(rng)
+        for start, stop in self.chunks():
+            source.extrinsic(stop - start, out=self.extrinsic_value[start:stop])
+
+    def top_bottom_k(self, k):
+        # Each chunk contributes its own top/bottom k; merging keeps at most 2k candidates at a time
+        top = np.empty(0, dtype=np.int64)
+        bottom = np.empty(0, dtype=np.int64)
+        for start, stop in self.chunks():
+            phenotype = self.phenotype[start:stop]
+            top = np.concatenate([top, top_k(phenotype, k) + start])
+            bottom = np.concatenate([bottom, bottom_k(phenotype, k) + start])
+            top = top[top_k(self.phenotype[top], k)]
+            bottom = bottom[bottom_k(self.phenotype[bottom], k)]
+        return top, bottom
+
+    def statistics(self):
+        # Mean and standard deviation merged chunk by chunk, so no chunk is revisited
+        statistics = OnlineStats()
+        for start, stop in self.chunks():
+            statistics.update(self.phenotype[start:stop])
+        return statistics.mean, statistics.std
+
+    def flush(self):
+        for name in FIELDS:
+            getattr(self, name).flush()
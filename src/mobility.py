@@ -0,0 +1,118 @@
+import numpy as np
+
+# Named quantile resolutions; any other bucket count can be passed as an int
+QUANTILES = {"quintiles": 5, "deciles": 10, "percentiles": 100}
+
+
+def bucket_count(quantiles):
+    if isinstance(quantiles, str):
+        if quantiles.isdigit():
+            return int(quantiles)
+        if quantiles not in QUANTILES:
+            raise ValueError(f"unknown quantiles {quantiles!r}, expected a number or one of {', '.join(QUANTILES)}")
+        return QUANTILES[quantiles]
+    if quantiles < 1:
+        raise ValueError("quantiles must be at least 1")
+    return int(quantiles)
+
+
+def quantile_buckets(values, buckets, out=None, scratch=None):
+    # Quantile bucket of every value, 0 = lowest, cut the same way as ChangeTracker.starting_buckets:
+    # the cut values come from one multi-pivot partition of a scratch copy, then a binary search over
+    # the buckets - 1 cuts places every value
+    n = len(values)
+    if out is None:
+        out = np.empty(n, dtype=np.uint8 if buckets <= 256 else np.uint16)
+    cuts = [n * b // buckets for b in range(1, buckets) if n * b // buckets < n]
+    if not cuts:
+        out[:] = 0
+        return out
+    if scratch is None:
+        scratch = np.empty_like(values)
+    np.copyto(scratch, values)
+    scratch.partition(cuts)
+    out[:] = np.searchsorted(scratch[cuts], values, side='right')
+    return out
+
+
+class MobilityMatrix:
+    # Bucket-to-bucket transition counts between consecutive rounds. Every round costs one bucketing
+    # pass and one bincount over the whole population, and memory stays at the (b, b) counts plus two
+    # rounds of small-integer buckets, however many rounds are streamed through.
+    def __init__(self, quantiles=5):
+        self.buckets = bucket_count(quantiles)
+        self.counts = np.zeros((self.buckets, self.buckets), dtype=np.int64)
+        # Counts of the most recent transition alone
+        self.last = np.zeros_like(self.counts)
+        self.transitions = 0
+        self.current = None
+        self.previous = None
+        self.scratch = None
+
+    def buffers(self, values):
+        if self.current is None or len(self.current) != len(values) or self.scratch.dtype != values.dtype:
+            dtype = np.uint8 if self.buckets <= 256 else np.uint16
+            self.current = np.empty(len(values), dtype=dtype)
+            self.previous = np.empty(len(values), dtype=dtype)
+            self.scratch = np.empty_like(values)
+            return False
+        return True
+
+    def rebucket(self, values):
+        # Start from this ranking without counting a transition, e.g. a new population or a new weight
+        values = np.asarray(values)
+        self.buffers(values)
+        quantile_buckets(values, self.buckets, self.current, self.scratch)
+
+    def update(self, values, previous=None):
+        # One transition from the last bucketed round to `values`. `previous` ranks a different
+        # previous round instead, e.g. the last round reweighted to the current weight
+        values = np.asarray(values)
+        if not self.buffers(values) and previous is None:
+            quantile_buckets(values, self.buckets, self.current, self.scratch)
+            return self
+        self.previous, self.current = self.current, self.previous
+        if previous is not None:
+            quantile_buckets(np.asarray(previous), self.buckets, self.previous, self.scratch)
+        quantile_buckets(values, self.buckets, self.current, self.scratch)
+
+        index = self.previous.astype(np.intp)
+        index *= self.buckets
+        index += self.current
+        self.last = np.bincount(index, minlength=self.buckets ** 2).reshape(self.buckets, self.buckets)
+        self.counts += self.last
+        self.transitions += 1
+        return self
+
+    def reset(self):
+        # Forget the counts, keep the current ranking as the starting point
+        self.counts[:] = 0
+        self.last[:] = 0
+        self.transitions = 0
+
+    def probabilities(self, counts=None):
+        # Row-normalized: entry (i, j) is the share of bucket i that moved to bucket j
+        counts = self.counts if counts is None else counts
+        totals = counts.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return counts / totals
+
+    def persistence(self):
+        # Share of every bucket still in the same bucket one round later
+        return np.diagonal(self.probabilities()).copy()
+
+    def mobility_index(self):
+        # Shorrocks' index (b - trace P) / (b - 1): 0 when nobody changes bucket, 1 when the next
+        # round's bucket is independent of this one's
+        if self.buckets < 2 or not self.transitions:
+            return np.nan
+        return float((self.buckets - np.trace(self.probabilities())) / (self.buckets - 1))
+
+    def summary(self):
+        return {
+            "quantiles": self.buckets,
+            "transitions": self.transitions,
+            "mobility_index": self.mobility_index(),
+            "persistence": self.persistence().tolist(),
+            "counts": self.counts.tolist(),
+        }
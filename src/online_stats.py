@@ -0,0 +1,159 @@
+import numpy as np
+
+# Batch Welford updates: each update() folds a whole array into the running moments with the
+# pairwise merge of Chan et al., so values are visited once and old rounds are never revisited.
+# Accumulators are Python floats (float64) whatever the dtype of the incoming arrays; float32 arrays
+# are folded in chunks with float64 deviations, as safe as float64 input with small temporaries.
+
+CHUNK = 2 ** 18
+
+
+def defined(value):
+    # Undefined statistics (NaN, e.g. the std of an empty accumulator) become None, through nested
+    # summaries too, so a summary is valid JSON and means the same everywhere it is stored
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: defined(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [defined(item) for item in value]
+    return value
+
+
+class OnlineStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values)
+        if values.dtype != np.float64 and values.size > CHUNK:
+            values = values.ravel()
+            for start in range(0, values.size, CHUNK):
+                self.update(values[start:start + CHUNK])
+            return self
+        count = values.size
+        if count == 0:
+            return self
+        mean = float(np.mean(values, dtype=np.float64))
+        deviations = np.subtract(values, mean, dtype=np.float64)
+        m2 = float(np.sum(np.square(deviations, out=deviations)))
+        return self.merge_moments(count, mean, m2)
+
+    def merge(self, other):
+        return self.merge_moments(other.count, other.mean, other.m2)
+
+    def merge_moments(self, count, mean, m2):
+        if count == 0:
+            return self
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        return self
+
+    def moments(self):
+        # Plain (count, mean, m2), cheap to send between processes and fed back with merge_moments
+        return self.count, self.mean, self.m2
+
+    def variance(self, ddof=0):
+        return self.m2 / (self.count - ddof) if self.count > ddof else np.nan
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.variance()))
+
+
+class OnlineCovariance:
+    def __init__(self):
+        self.x = OnlineStats()
+        self.y = OnlineStats()
+        self.c = 0.0
+
+    @property
+    def count(self):
+        return self.x.count
+
+    def update(self, x, y):
+        x = np.asarray(x)
+        y = np.asarray(y)
+        if (x.dtype != np.float64 or y.dtype != np.float64) and x.size > CHUNK:
+            x = x.ravel()
+            y = y.ravel()
+            for start in range(0, x.size, CHUNK):
+                self.update(x[start:start + CHUNK], y[start:start + CHUNK])
+            return self
+        batch = OnlineCovariance()
+        batch.x.update(x)
+        batch.y.update(y)
+        if batch.count:
+            batch.c = float(np.dot(np.subtract(x, batch.x.mean, dtype=np.float64), np.subtract(y, batch.y.mean, dtype=np.float64)))
+        return self.merge(batch)
+
+    def moments(self):
+        return self.x.moments(), self.y.moments(), self.c
+
+    @classmethod
+    def from_moments(cls, x, y, c):
+        covariance = cls()
+        covariance.x.merge_moments(*x)
+        covariance.y.merge_moments(*y)
+        covariance.c = c
+        return covariance
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        total = self.count + other.count
+        self.c += other.c + (other.x.mean - self.x.mean) * (other.y.mean - self.y.mean) * self.count * other.count / total
+        self.x.merge(other.x)
+        self.y.merge(other.y)
+        return self
+
+    def covariance(self, ddof=0):
+        return self.c / (self.count - ddof) if self.count > ddof else np.nan
+
+    @property
+    def correlation(self):
+        denominator = np.sqrt(self.x.m2 * self.y.m2)
+        return self.c / denominator if denominator else np.nan
+
+    @property
+    def slope(self):
+        # Least-squares slope of y on x, i.e. how much of a deviation carries over
+        return self.c / self.x.m2 if self.x.m2 else np.nan
+
+
+class RoundStatistics:
+    def __init__(self):
+        self.rounds = 0
+        self.current = OnlineStats()
+        self.previous = OnlineStats()
+        # Every phenotype of every round, and every (previous, current) phenotype pair
+        self.pooled = OnlineStats()
+        self.cross_round = OnlineCovariance()
+        self.last_pair = OnlineCovariance()
+
+    def set_current(self, phenotype):
+        # The current round changed in place (e.g. a new weight), without starting a new round
+        self.current = OnlineStats().update(phenotype)
+
+    def set_current_moments(self, count, mean, variance):
+        # Same as set_current when the moments are already known, e.g. from a WeightSweep
+        self.current = OnlineStats().merge_moments(count, mean, variance * count)
+
+    def add_round(self, phenotype, previous_phenotype=None):
+        pair = OnlineCovariance().update(previous_phenotype, phenotype) if previous_phenotype is not None else None
+        self.add_round_moments(OnlineStats().update(phenotype), pair)
+
+    def add_round_moments(self, current, pair=None):
+        # Same as add_round from accumulators that were already reduced elsewhere, e.g. merged shards
+        self.previous = self.current
+        self.current = current
+        self.pooled.merge(self.current)
+        if pair is not None:
+            self.last_pair = pair
+            self.cross_round.merge(self.last_pair)
+        self.rounds += 1
@@ -0,0 +1,90 @@
+import numpy as np
+from individual import Individual
+from random_source import as_source
+
+
+class Population:
+    def __init__(self, id, intrinsic_value, extrinsic_value, weight_genetic=0.5, dtype=np.float64):
+        # dtype is float64 by default; float32 halves memory and bandwidth for very large populations,
+        # and statistics over float32 arrays still accumulate in float64
+        self.id = np.asarray(id)
+        self.dtype = np.dtype(dtype)
+        self.intrinsic_value = np.asarray(intrinsic_value, dtype=self.dtype)
+        self.extrinsic_value = np.asarray(extrinsic_value, dtype=self.dtype)
+        self.genetic_score = np.empty_like(self.intrinsic_value)
+        self.environmental_score = np.empty_like(self.extrinsic_value)
+        self.phenotype = np.empty_like(self.intrinsic_value)
+        self.calculate_phenotype(weight_genetic)
+
+    @classmethod
+    def generate(cls, n, weight_genetic=0.5, rng=np.random, dtype=np.float64):
+        # Two block draws instead of two np.random.normal calls per individual.
+        # rng is the legacy global state by default, any numpy Generator, or a RandomSource;
+        # a RandomSource with the same dtype draws float32 directly instead of casting
+        source = as_source(rng)
+        intrinsic_values = source.intrinsic(n)
+        extrinsic_values = source.extrinsic(n)
+        return cls(np.arange(1, n + 1), intrinsic_values, extrinsic_values, weight_genetic, dtype)
+
+    @classmethod
+    def from_individuals(cls, individuals, weight_genetic=0.5):
+        return cls([ind.id for ind in individuals],
+                   [ind.intrinsic_value for ind in individuals],
+                   [ind.extrinsic_value for ind in individuals],
+                   weight_genetic)
+
+    def __len__(self):
+        return len(self.id)
+
+    def __getitem__(self, i):
+        # Materialize a single row as an Individual, e.g. for debugging or old callers
+        individual = Individual(self.id[i], self.intrinsic_value[i], self.extrinsic_value[i])
+        individual.genetic_score = self.genetic_score[i]
+        individual.environmental_score = self.environmental_score[i]
+        individual.phenotype = self.phenotype[i]
+        return individual
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def rows(self, positions):
+        # Individuals at the given positions, in that order
+        return [self[i] for i in positions]
+
+    def calculate_phenotype(self, weight_genetic):
+        # Same model as Individual.calculate_phenotype, written into the existing arrays
+        np.multiply(self.intrinsic_value, weight_genetic, out=self.genetic_score)
+        np.multiply(self.extrinsic_value, 1 - weight_genetic, out=self.environmental_score)
+        np.add(self.genetic_score, self.environmental_score, out=self.phenotype)
+        return self.phenotype
+
+    def phenotype_at(self, weight_genetic):
+        # Phenotype under a given weight without overwriting the stored scores
+        return self.intrinsic_value * weight_genetic + self.extrinsic_value * (1 - weight_genetic)
+
+    def scores_at(self, weight_genetic):
+        # Fresh (genetic_score, environmental_score, phenotype) arrays, safe to compute off the Tk thread
+        genetic_score = self.intrinsic_value * weight_genetic
+        environmental_score = self.extrinsic_value * (1 - weight_genetic)
+        return genetic_score, environmental_score, genetic_score + environmental_score
+
+    def set_scores(self, genetic_score, environmental_score, phenotype):
+        self.genetic_score = genetic_score
+        self.environmental_score = environmental_score
+        self.phenotype = phenotype
+
+    def reshuffle_environment(self, rng=np.random):
+        # Only the environmental component is redrawn, the genetic component stays fixed
+        as_source(rng).extrinsic(len(self), out=self.extrinsic_value)
+
+    def copy(self):
+        population = Population.__new__(Population)
+        population.id = self.id.copy()
+        population.dtype = self.dtype
+        population.intrinsic_value = self.intrinsic_value.copy()
+        population.extrinsic_value = self.extrinsic_value.copy()
+        population.genetic_score = self.genetic_score.copy()
+        population.environmental_score = self.environmental_score.copy()
+        population.phenotype = self.phenotype.copy()
+        return population
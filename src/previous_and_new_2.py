@@ -1,7 +1,12 @@
 import tkinter as tk
 from tkinter import ttk
-import numpy as np
-from individual import Individual
+from core import SimulationCore
+from virtual_table import VirtualTable
+from scheduler import RenderScheduler
+from instrumentation import PhaseTimer
+from random_source import RandomSource
+from histogram_panel import HistogramPanel
+from checkpoint import resume_session, save_session
 
 class SimulationApp:
     def __init__(self, root):
@@ -9,126 +14,123 @@ class SimulationApp:
         self.root.title("Regression to the Mean Simulation")
 
         self.n = 100
+        self.k = 5  # Size of the top/bottom selections
         self.weight_genetic = 0.5  # Start with 50% genetic weight
-        self.round = 1
+        self.history_depth = 10  # Rounds kept for lag comparisons
 
-        # Generate initial population
-        self.population = self.generate_population(self.n)
-        self.previous_population = []  # Store the entire previous population
+        # Per-phase timings for the status bar, and a JSON lines log when SIMULATION_TIMING_LOG is set
+        self.timer = PhaseTimer.from_environment()
 
-        # Store genetic components separately
-        self.genetic_components = [ind.intrinsic_value for ind in self.population]
+        # All simulation state lives in the shared core, this class only renders it. With
+        # SIMULATION_CHECKPOINT set, the session saved there on close is picked up where it was left
+        self.core = resume_session(prefill=True, timer=self.timer)
+        if self.core is None:
+            # The next block of environment draws is prepared on a background thread while a round renders
+            self.random = RandomSource(prefill=True)
+            self.core = SimulationCore(self.n, self.weight_genetic, self.k, self.history_depth, self.random, timer=self.timer)
+        else:
+            self.random = self.core.rng
+            self.n, self.k, self.weight_genetic = self.core.n, self.core.k, self.core.weight_genetic
+
+        # Slider work runs on a background worker, results are applied on the Tk thread
+        self.scheduler = RenderScheduler(self.root, self.core.weight_scores, self.apply_weight)
 
         # Create UI components
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
         # Display initial phenotypes
-        self.update_phenotypes(self.population)
         self.display_table()
-        self.update_top_bottom_five()
+        self.update_histogram()
+        self.update_top_bottom()
         self.update_statistics()
 
-    def generate_population(self, n):
-        population = []
-        for i in range(1, n + 1):
-            intrinsic_value = np.random.normal(100, 10)
-            extrinsic_value = np.random.normal(100, 10)
-            population.append(Individual(i, intrinsic_value, extrinsic_value))
-        return population
-
-    def update_phenotypes(self, population):
-        for individual in population:
-            individual.phenotype = individual.calculate_phenotype(self.weight_genetic)
-
     def reshuffle_environment(self):
-        self.previous_population = [Individual(ind.id, ind.intrinsic_value, ind.extrinsic_value) for ind in self.population]
-        for i, individual in enumerate(self.population):
-            individual.extrinsic_value = np.random.normal(100, 10)  # Only reshuffle the environmental component
-            individual.intrinsic_value = self.genetic_components[i]  # Ensure genetic component remains unchanged
-        self.update_phenotypes(self.population)
-        self.display_table()
-        self.track_changes()
-        self.update_top_bottom_five()
-        self.update_statistics()
-        self.round += 1
+        # Any slider result still in flight was computed for the old environment
+        self.scheduler.cancel()
+        with self.timer.phase("reshuffle_environment"):
+            self.core.reshuffle(self.weight_genetic)  # Only reshuffles the environmental component
+            with self.timer.phase("display_table"):
+                self.display_table()
+            with self.timer.phase("histogram"):
+                self.update_histogram()
+            with self.timer.phase("change_labels"):
+                self.track_changes()
+            with self.timer.phase("top_bottom_tables"):
+                self.update_top_bottom()
+            with self.timer.phase("statistics_label"):
+                self.update_statistics()
+        self.update_status()
 
     def display_table(self):
-        for i, individual in enumerate(self.population):
-            self.table.item(self.table.get_children()[i], values=(individual.id, f"{individual.phenotype:.2f}", f"{individual.genetic_score:.2f}", f"{individual.environmental_score:.2f}"))
+        # Only the rows currently scrolled into view are pushed to Tk
+        population = self.core.population
+        self.table.set_data(population.id, population.phenotype, population.genetic_score, population.environmental_score)
 
-    def update_top_bottom_five(self):
-        sorted_population = sorted(self.population, key=lambda x: x.phenotype, reverse=True)
-        
-        self.top_five_ids = [ind.id for ind in sorted_population[:5]]
-        self.bottom_five_ids = [ind.id for ind in sorted_population[-5:]]
+    def update_histogram(self):
+        # Only the bars whose height changed are redrawn
+        population = self.core.population
+        self.histogram.update(population.phenotype, population.genetic_score, population.environmental_score)
 
-        self.previous_top_five = [ind for ind in self.population if ind.id in self.top_five_ids]
-        self.previous_bottom_five = [ind for ind in self.population if ind.id in self.bottom_five_ids]
+    def update_top_bottom(self):
+        core = self.core
+        # Only the handful of selected rows are materialized as Individuals
+        self.previous_top = core.population.rows(core.top_positions)
+        self.previous_bottom = core.population.rows(core.bottom_positions)
 
         self.update_top_bottom_tables()
 
     def update_top_bottom_tables(self):
-        for i, individual in enumerate(self.previous_top_five):
+        for i, individual in enumerate(self.previous_top):
             values = (individual.id, f"{individual.phenotype:.2f}", f"{individual.genetic_score:.2f}", f"{individual.environmental_score:.2f}")
-            if i < len(self.top_five_table.get_children()):
-                self.top_five_table.item(self.top_five_table.get_children()[i], values=values)
+            if i < len(self.top_table.get_children()):
+                self.top_table.item(self.top_table.get_children()[i], values=values)
             else:
-                self.top_five_table.insert('', 'end', values=values)
+                self.top_table.insert('', 'end', values=values)
 
-        for i, individual in enumerate(self.previous_bottom_five):
+        for i, individual in enumerate(self.previous_bottom):
             values = (individual.id, f"{individual.phenotype:.2f}", f"{individual.genetic_score:.2f}", f"{individual.environmental_score:.2f}")
-            if i < len(self.bottom_five_table.get_children()):
-                self.bottom_five_table.item(self.bottom_five_table.get_children()[i], values=values)
+            if i < len(self.bottom_table.get_children()):
+                self.bottom_table.item(self.bottom_table.get_children()[i], values=values)
             else:
-                self.bottom_five_table.insert('', 'end', values=values)
+                self.bottom_table.insert('', 'end', values=values)
 
     def track_changes(self):
-        if self.round > 1:
-            # Calculate weighted phenotypes for current and previous populations
-            current_phenotypes = {ind.id: ind.calculate_phenotype(self.weight_genetic) for ind in self.population}
-            previous_phenotypes = {ind.id: ind.calculate_phenotype(self.weight_genetic) for ind in self.previous_population}
-
-            # Previous round top and bottom 5 IDs
-            previous_top_five_ids = [ind.id for ind in self.previous_population if ind.id in self.top_five_ids]
-            previous_bottom_five_ids = [ind.id for ind in self.previous_population if ind.id in self.bottom_five_ids]
-
-            # Current round top and bottom 5 IDs
-            sorted_population = sorted(self.population, key=lambda x: x.calculate_phenotype(self.weight_genetic), reverse=True)
-            new_top_five_ids = [ind.id for ind in sorted_population[:5]]
-            new_bottom_five_ids = [ind.id for ind in sorted_population[-5:]]
-
-            # Calculate changes for previous top and bottom
-            previous_top_five_changes = [(id, round(current_phenotypes[id] - previous_phenotypes[id], 2)) for id in previous_top_five_ids]
-            previous_bottom_five_changes = [(id, round(current_phenotypes[id] - previous_phenotypes[id], 2)) for id in previous_bottom_five_ids]
-
-            prev_top_changes_str = ", ".join([f"ID {id}: {change:+.2f}" for id, change in previous_top_five_changes])
-            prev_bottom_changes_str = ", ".join([f"ID {id}: {change:+.2f}" for id, change in previous_bottom_five_changes])
+        core = self.core
+        if core.has_changes():
+            # Changes for previous top and bottom, ids line up with positions in both rounds
+            prev_top_changes_str = core.tracker.labels(core.previous_top_positions)
+            prev_bottom_changes_str = core.tracker.labels(core.previous_bottom_positions)
 
-            # Calculate changes for new top and bottom
-            new_top_five_changes = [(id, round(current_phenotypes[id] - previous_phenotypes[id], 2)) for id in new_top_five_ids]
-            new_bottom_five_changes = [(id, round(current_phenotypes[id] - previous_phenotypes[id], 2)) for id in new_bottom_five_ids]
+            # Changes for new top and bottom
+            new_top_changes_str = core.tracker.labels(core.top_positions)
+            new_bottom_changes_str = core.tracker.labels(core.bottom_positions)
 
-            new_top_changes_str = ", ".join([f"ID {id}: {change:+.2f}" for id, change in new_top_five_changes])
-            new_bottom_changes_str = ", ".join([f"ID {id}: {change:+.2f}" for id, change in new_bottom_five_changes])
+            # Mean change of every starting decile, the whole regression-to-the-mean curve in one line
+            decile_changes_str = ", ".join(f"{change:+.2f}" for change in core.tracker.mean_delta_by_bucket(10))
 
-            self.previous_top_changes_label.config(text=f"Change in Previous Top 5: {prev_top_changes_str}")
-            self.previous_bottom_changes_label.config(text=f"Change in Previous Bottom 5: {prev_bottom_changes_str}")
+            self.previous_top_changes_label.config(text=f"Change in Previous Top {self.k}: {prev_top_changes_str}")
+            self.previous_bottom_changes_label.config(text=f"Change in Previous Bottom {self.k}: {prev_bottom_changes_str}")
 
-            self.new_top_changes_label.config(text=f"Change in New Top 5: {new_top_changes_str}")
-            self.new_bottom_changes_label.config(text=f"Change in New Bottom 5: {new_bottom_changes_str}")
+            self.new_top_changes_label.config(text=f"Change in New Top {self.k}: {new_top_changes_str}")
+            self.new_bottom_changes_label.config(text=f"Change in New Bottom {self.k}: {new_bottom_changes_str}")
+            self.decile_changes_label.config(text=f"Mean change by starting decile: {decile_changes_str}")
 
-            # Update for next round
-            self.top_five_ids = new_top_five_ids
-            self.bottom_five_ids = new_bottom_five_ids
+            # Accumulated quintile transitions since the start, rows are the starting quintile
+            mobility = core.mobility
+            rows = "\n".join(" ".join(f"{share:4.0%}" for share in row) for row in mobility.probabilities())
+            self.mobility_label.config(text=f"Quintile transitions over {mobility.transitions} rounds (mobility index {mobility.mobility_index():.2f}):\n{rows}")
 
     def update_statistics(self):
-        phenotypes = [ind.phenotype for ind in self.population]
-        previous_phenotypes = [ind.phenotype for ind in self.previous_population] if self.previous_population else phenotypes
-        mean = np.mean(phenotypes)
-        std_dev = np.std(phenotypes)
-        previous_mean = np.mean(previous_phenotypes)
-        previous_std_dev = np.std(previous_phenotypes)
-        self.statistics_label.config(text=f"Previous Mean: {previous_mean:.2f}, Std Dev: {previous_std_dev:.2f}\nNew Mean: {mean:.2f}, Std Dev: {std_dev:.2f}")
+        # Read from the running accumulators, nothing is recomputed here
+        statistics = self.core.statistics
+        current = statistics.current
+        previous = statistics.previous if statistics.rounds > 1 else current
+        cross_round = statistics.cross_round
+        self.statistics_label.config(text=f"Previous Mean: {previous.mean:.2f}, Std Dev: {previous.std:.2f}\nNew Mean: {current.mean:.2f}, Std Dev: {current.std:.2f}\nRound-to-round correlation: {cross_round.correlation:.2f}, Regression slope: {cross_round.slope:.2f}")
+
+    def update_status(self):
+        self.status_bar.config(text=self.timer.status())
 
     def create_widgets(self):
         # Maximize window
@@ -167,11 +169,7 @@ class SimulationApp:
 
         # Table to display phenotypes
         columns = ("ID", "Phenotype", "Genetic", "Environmental")
-        self.table = ttk.Treeview(table_frame_1, columns=columns, show='headings')
-        self.table.heading("ID", text="ID")
-        self.table.heading("Phenotype", text="Phenotype")
-        self.table.heading("Genetic", text="Genetic")
-        self.table.heading("Environmental", text="Environmental")
+        self.table = VirtualTable(table_frame_1, columns, ("{}", "{:.2f}", "{:.2f}", "{:.2f}"), height=20)
         self.table.grid(row=0, column=0, pady=10)
 
         # Adjust the size of the main table
@@ -180,51 +178,81 @@ class SimulationApp:
         self.table.column("Genetic", width=100)
         self.table.column("Environmental", width=100)
 
-        for individual in self.population:
-            self.table.insert('', 'end', values=(individual.id, f"{individual.phenotype:.2f}", f"{individual.genetic_score:.2f}", f"{individual.environmental_score:.2f}"))
-
-        # New Top Five Table
-        self.top_five_label = ttk.Label(table_frame_2, text="New Top Five")
-        self.top_five_label.grid(row=0, column=0, pady=5)
-        self.top_five_table = ttk.Treeview(table_frame_2, columns=columns, show='headings', height=5)
+        # New Top k Table
+        self.top_label = ttk.Label(table_frame_2, text=f"New Top {self.k}")
+        self.top_label.grid(row=0, column=0, pady=5)
+        self.top_table = ttk.Treeview(table_frame_2, columns=columns, show='headings', height=self.k)
         for col in columns:
-            self.top_five_table.heading(col, text=col)
-            self.top_five_table.column(col, width=75)
-        self.top_five_table.grid(row=1, column=0, pady=10)
-
-        # New Bottom Five Table
-        self.bottom_five_label = ttk.Label(table_frame_3, text="New Bottom Five")
-        self.bottom_five_label.grid(row=0, column=0, pady=5)
-        self.bottom_five_table = ttk.Treeview(table_frame_3, columns=columns, show='headings', height=5)
+            self.top_table.heading(col, text=col)
+            self.top_table.column(col, width=75)
+        self.top_table.grid(row=1, column=0, pady=10)
+
+        # New Bottom k Table
+        self.bottom_label = ttk.Label(table_frame_3, text=f"New Bottom {self.k}")
+        self.bottom_label.grid(row=0, column=0, pady=5)
+        self.bottom_table = ttk.Treeview(table_frame_3, columns=columns, show='headings', height=self.k)
         for col in columns:
-            self.bottom_five_table.heading(col, text=col)
-            self.bottom_five_table.column(col, width=75)
-        self.bottom_five_table.grid(row=1, column=0, pady=10)
+            self.bottom_table.heading(col, text=col)
+            self.bottom_table.column(col, width=75)
+        self.bottom_table.grid(row=1, column=0, pady=10)
 
         # Labels to display changes
-        self.previous_top_changes_label = ttk.Label(main_frame, text="Change in Previous Top 5: ")
+        self.previous_top_changes_label = ttk.Label(main_frame, text=f"Change in Previous Top {self.k}: ")
         self.previous_top_changes_label.grid(row=4, column=0, pady=5)
 
-        self.previous_bottom_changes_label = ttk.Label(main_frame, text="Change in Previous Bottom 5: ")
+        self.previous_bottom_changes_label = ttk.Label(main_frame, text=f"Change in Previous Bottom {self.k}: ")
         self.previous_bottom_changes_label.grid(row=5, column=0, pady=5)
 
-        self.new_top_changes_label = ttk.Label(main_frame, text="Change in New Top 5: ")
+        self.new_top_changes_label = ttk.Label(main_frame, text=f"Change in New Top {self.k}: ")
         self.new_top_changes_label.grid(row=4, column=2, pady=5)  # Adjusted to column 2
 
-        self.new_bottom_changes_label = ttk.Label(main_frame, text="Change in New Bottom 5: ")
+        self.new_bottom_changes_label = ttk.Label(main_frame, text=f"Change in New Bottom {self.k}: ")
         self.new_bottom_changes_label.grid(row=5, column=2, pady=5)  # Adjusted to column 2
 
+        self.decile_changes_label = ttk.Label(main_frame, text="Mean change by starting decile: ")
+        self.decile_changes_label.grid(row=6, column=0, columnspan=3, pady=5)
+
         # Label to display statistics
-        self.statistics_label = ttk.Label(main_frame, text="Previous Mean: , Std Dev: \nNew Mean: , Std Dev: ")
-        self.statistics_label.grid(row=6, column=0, columnspan=3, pady=5)
+        self.statistics_label = ttk.Label(main_frame, text="Previous Mean: , Std Dev: \nNew Mean: , Std Dev: \nRound-to-round correlation: , Regression slope: ")
+        self.statistics_label.grid(row=7, column=0, columnspan=3, pady=5)
+
+        # Label to display the quintile mobility matrix
+        self.mobility_label = ttk.Label(main_frame, text="Quintile transitions: ", font="TkFixedFont")
+        self.mobility_label.grid(row=8, column=0, columnspan=3, pady=5)
+
+        # Live phenotype distribution, with the genetic and environmental components as lines
+        self.histogram = HistogramPanel(main_frame, width=600)
+        self.histogram.grid(row=9, column=0, columnspan=3, pady=5)
+
+        # Status bar with the rolling per-phase timings
+        self.status_bar = ttk.Label(self.root, text="", relief='sunken', anchor='w')
+        self.status_bar.grid(row=1, column=0, sticky=(tk.W, tk.E))
 
     def slider_changed(self, event):
         self.weight_genetic = self.slider.get() / 100.0
         self.gen_env_label.config(text=f"Genetic: {self.weight_genetic*100:.1f}%, Environmental: {(1-self.weight_genetic)*100:.1f}%")
-        self.update_phenotypes(self.population)
-        self.display_table()
-        self.update_statistics()
-        self.update_top_bottom_five()
+        # Intermediate drag positions are coalesced, only the latest weight is computed
+        self.scheduler.submit(self.weight_genetic)
+
+    def apply_weight(self, result):
+        with self.timer.phase("apply_weight"):
+            self.core.apply_weight_scores(result)
+            with self.timer.phase("display_table"):
+                self.display_table()
+            with self.timer.phase("histogram"):
+                self.update_histogram()
+            with self.timer.phase("statistics_label"):
+                self.update_statistics()
+            with self.timer.phase("top_bottom_tables"):
+                self.update_top_bottom()
+        self.update_status()
+
+    def close(self):
+        # Slider work still in flight is dropped first, so the saved session is the one on screen
+        self.scheduler.close()
+        save_session(self.core)
+        self.random.close()
+        self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,217 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+
+# Default distribution of both the intrinsic and the extrinsic values
+MEAN = 100
+SD = 10
+
+BIT_GENERATORS = {
+    "pcg64": np.random.PCG64,
+    "philox": np.random.Philox,
+    "sfc64": np.random.SFC64,
+}
+
+# Default size of one buffered block of environment draws, 8 MB of float64
+BLOCK_ELEMENTS = 2 ** 20
+
+
+class RandomSource:
+    # All random draws of a simulation. Intrinsic and extrinsic values come from two independent
+    # streams spawned from one seed, so the environment can be drawn ahead in blocks (and on a
+    # background thread) without changing which numbers any round gets: a block of R rounds is
+    # exactly the next R rounds of the extrinsic stream.
+    def __init__(self, seed=None, bit_generator="pcg64", intrinsic_mean=MEAN, intrinsic_sd=SD,
+                 extrinsic_mean=MEAN, extrinsic_sd=SD, block_elements=BLOCK_ELEMENTS, prefill=False, dtype=np.float64):
+        if bit_generator not in BIT_GENERATORS:
+            raise ValueError(f"unknown bit generator {bit_generator!r}, expected one of {', '.join(BIT_GENERATORS)}")
+        seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        intrinsic_seed, extrinsic_seed = seed_sequence.spawn(2)
+        self.bit_generator = bit_generator
+        self.intrinsic_generator = np.random.Generator(BIT_GENERATORS[bit_generator](intrinsic_seed))
+        self.extrinsic_generator = np.random.Generator(BIT_GENERATORS[bit_generator](extrinsic_seed))
+        self.intrinsic_mean = intrinsic_mean
+        self.intrinsic_sd = intrinsic_sd
+        self.extrinsic_mean = extrinsic_mean
+        self.extrinsic_sd = extrinsic_sd
+        self.block_elements = block_elements
+        # float32 draws use numpy's float32 ziggurat: half the bytes, and a different stream than float64
+        self.dtype = np.dtype(dtype)
+        # Buffered block of future rounds and the next unused row in it
+        self.block = None
+        self.row = 0
+        # With prefill, the extrinsic stream is only ever touched by this one worker thread
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="prefill") if prefill else None
+        self.pending = None
+
+    @classmethod
+    def wrap(cls, rng):
+        # A plain numpy Generator or the legacy np.random module as a RandomSource with the default
+        # distributions. Both streams are the same object and nothing is buffered, so draws come out in
+        # exactly the order the code asks for them, as before there was a RandomSource
+        source = cls.__new__(cls)
+        source.bit_generator = None
+        source.intrinsic_generator = source.extrinsic_generator = rng
+        source.intrinsic_mean = source.extrinsic_mean = MEAN
+        source.intrinsic_sd = source.extrinsic_sd = SD
+        source.block_elements = 0
+        source.dtype = np.dtype(np.float64)
+        source.block = None
+        source.row = 0
+        source.executor = None
+        source.pending = None
+        return source
+
+    def intrinsic(self, size):
+        return draw(self.intrinsic_generator, self.intrinsic_mean, self.intrinsic_sd, size, dtype=self.dtype)
+
+    def intrinsic_noise(self, size, sd=1.0):
+        # Zero-mean noise on the genetic side (segregation, mating scores), from the intrinsic stream
+        return draw(self.intrinsic_generator, 0.0, sd, size, dtype=self.dtype)
+
+    def permutation(self, n):
+        return self.intrinsic_generator.permutation(n)
+
+    def extrinsic(self, n, out=None):
+        # One round of environment values, from the buffered block when blocks are in use
+        if self.block_elements <= 0:
+            return self.draw_extrinsic(n, out)
+        if self.block is None or self.row == len(self.block) or self.block.shape[1] != n:
+            rounds = max(1, self.block_elements // n)
+            if rounds == 1 and self.executor is None and self.pending is None:
+                # A block of one round would only be drawn and copied again; draw into the target
+                self.block = None
+                return self.draw_extrinsic(n, out)
+            self.block = self.next_block(rounds, n)
+            self.row = 0
+        values = self.block[self.row]
+        self.row += 1
+        if out is None:
+            return values.copy()
+        out[...] = values
+        return out
+
+    def extrinsic_rounds(self, rounds, n):
+        # (rounds, n) environment values, the next `rounds` rounds of the stream. Rows still buffered
+        # are used first; the rest is drawn straight into the result when nothing is pending
+        out = np.empty((rounds, n), dtype=self.dtype)
+        filled = 0
+        if self.block is not None and self.block.shape[1] == n:
+            take = min(rounds, len(self.block) - self.row)
+            out[:take] = self.block[self.row:self.row + take]
+            self.row += take
+            filled = take
+        if filled < rounds and self.pending is None:
+            self.draw_extrinsic((rounds - filled, n), out[filled:])
+            filled = rounds
+        while filled < rounds:
+            out[filled] = self.extrinsic(n)
+            filled += 1
+        return out
+
+    def next_block(self, rounds, n):
+        # A block drawn ahead is used first, also when it was restored from a checkpoint without prefill
+        if self.pending is None:
+            if self.executor is None:
+                return self.draw_extrinsic((rounds, n))
+            self.pending = self.executor.submit(self.draw_extrinsic, (rounds, n))
+        block = self.pending.result()
+        self.pending = None
+        if block.shape != (rounds, n):
+            # n changed since the block was queued, e.g. a new population; draw one of the right shape.
+            # Nothing is pending, so the worker thread is not touching the stream
+            block = self.draw_extrinsic((rounds, n))
+        if self.executor is not None:
+            # The next block is drawn on the worker thread while the caller works through this one
+            self.pending = self.executor.submit(self.draw_extrinsic, (rounds, n))
+        return block
+
+    def draw_extrinsic(self, size, out=None):
+        return draw(self.extrinsic_generator, self.extrinsic_mean, self.extrinsic_sd, size, out, self.dtype)
+
+    def get_state(self):
+        # Everything needed to continue exactly the same streams: both generator states, the buffered
+        # block and the block being drawn ahead, which the extrinsic generator has already moved past
+        pending = self.pending.result() if self.pending is not None else None
+        return {
+            "bit_generator": self.bit_generator,
+            "intrinsic_generator": generator_state(self.intrinsic_generator),
+            "extrinsic_generator": generator_state(self.extrinsic_generator) if self.extrinsic_generator is not self.intrinsic_generator else None,
+            "intrinsic_mean": self.intrinsic_mean,
+            "intrinsic_sd": self.intrinsic_sd,
+            "extrinsic_mean": self.extrinsic_mean,
+            "extrinsic_sd": self.extrinsic_sd,
+            "block_elements": self.block_elements,
+            "dtype": self.dtype.name,
+            "block": self.block,
+            "row": self.row,
+            "pending": pending,
+        }
+
+    @classmethod
+    def from_state(cls, state, prefill=False):
+        source = cls.__new__(cls)
+        source.bit_generator = state["bit_generator"]
+        source.intrinsic_generator = restore_generator(state["intrinsic_generator"])
+        if state["extrinsic_generator"] is None:
+            source.extrinsic_generator = source.intrinsic_generator
+        else:
+            source.extrinsic_generator = restore_generator(state["extrinsic_generator"])
+        source.intrinsic_mean = state["intrinsic_mean"]
+        source.intrinsic_sd = state["intrinsic_sd"]
+        source.extrinsic_mean = state["extrinsic_mean"]
+        source.extrinsic_sd = state["extrinsic_sd"]
+        source.block_elements = state["block_elements"]
+        source.dtype = np.dtype(state["dtype"])
+        source.block = state["block"]
+        source.row = state["row"]
+        source.executor = ThreadPoolExecutor(1, thread_name_prefix="prefill") if prefill else None
+        source.pending = None
+        if state["pending"] is not None:
+            source.pending = Future()
+            source.pending.set_result(state["pending"])
+        return source
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+            self.pending = None
+
+
+def draw(generator, mean, sd, size, out=None, dtype=np.float64):
+    # Normal draws scaled in place, so a block costs one buffer and no temporaries. The legacy
+    # np.random module has no out= argument and goes through normal() instead
+    if isinstance(generator, np.random.Generator) and (out is None or out.dtype == dtype):
+        if out is None:
+            out = np.empty(size, dtype=dtype)
+        generator.standard_normal(dtype=out.dtype, out=out)
+        out *= sd
+        out += mean
+        return out
+    values = generator.normal(mean, sd, size)
+    if out is None:
+        return values.astype(dtype, copy=False)
+    out[...] = values
+    return out
+
+
+def generator_state(generator):
+    # A Generator's bit generator state, or the legacy state of np.random or a RandomState
+    if isinstance(generator, np.random.Generator):
+        return {"kind": "generator", "state": generator.bit_generator.state}
+    kind = "random_state" if isinstance(generator, np.random.RandomState) else "legacy"
+    return {"kind": kind, "state": generator.get_state(legacy=False)}
+
+
+def restore_generator(state):
+    if state["kind"] == "generator":
+        bit_generator = getattr(np.random, state["state"]["bit_generator"])()
+        bit_generator.state = state["state"]
+        return np.random.Generator(bit_generator)
+    generator = np.random.RandomState() if state["kind"] == "random_state" else np.random
+    generator.set_state(state["state"])
+    return generator
+
+
+def as_source(rng):
+    return rng if isinstance(rng, RandomSource) else RandomSource.wrap(rng)
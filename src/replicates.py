@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from population import Population
+from selection import top_bottom_k
+from random_source import RandomSource
+
+# Columns of the per-replicate result rows
+FIELDS = ("top_regression", "bottom_regression", "correlation")
+
+
+class ReplicateResults:
+    def __init__(self, rows):
+        self.rows = rows
+        for column, field in enumerate(FIELDS):
+            setattr(self, field, rows[:, column])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def summary(self):
+        # Mean and standard error of every field across replicates
+        n = len(self.rows)
+        mean = self.rows.mean(axis=0)
+        sem = self.rows.std(axis=0, ddof=1) / np.sqrt(n) if n > 1 else np.full(len(FIELDS), np.nan)
+        return {field: (float(mean[column]), float(sem[column])) for column, field in enumerate(FIELDS)}
+
+
+def run_replicate(rng, n, weight_genetic, rounds, k):
+    # One generate_population -> reshuffle_environment experiment, reduced to a single row:
+    # mean change of the top/bottom k selected in the previous round, and the round-to-round correlation
+    population = Population.generate(n, weight_genetic, rng)
+    totals = np.zeros(len(FIELDS))
+    for _ in range(rounds):
+        previous = population.phenotype.copy()
+        top, bottom = top_bottom_k(previous, k)
+        population.reshuffle_environment(rng)
+        population.calculate_phenotype(weight_genetic)
+        totals[0] += np.mean(population.phenotype[top] - previous[top])
+        totals[1] += np.mean(population.phenotype[bottom] - previous[bottom])
+        totals[2] += np.corrcoef(previous, population.phenotype)[0, 1]
+    return totals / rounds
+
+
+def run_chunk(seed_sequence, replicates, n, weight_genetic, rounds, k, random_options=None):
+    # Runs in a worker process and only sends the small result rows back. random_options are
+    # RandomSource arguments (bit generator, intrinsic/extrinsic mean and SD)
+    rng = RandomSource(seed_sequence, **random_options) if random_options else np.random.default_rng(seed_sequence)
+    return np.array([run_replicate(rng, n, weight_genetic, rounds, k) for _ in range(replicates)])
+
+
+def run_replicates(replicates, n, weight_genetic, rounds=1, k=5, seed=None, workers=None, chunk_size=16, random_options=None):
+    # Every chunk gets its own child of the master SeedSequence, so results depend on the seed
+    # and chunk_size but not on the number of workers or the order the chunks finish in
+    chunks = [min(chunk_size, replicates - start) for start in range(0, replicates, chunk_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunks))
+    tasks = [(seed_sequence, size, n, weight_genetic, rounds, k, random_options) for seed_sequence, size in zip(seed_sequences, chunks)]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        rows = [run_chunk(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            rows = list(executor.map(run_chunk, *zip(*tasks)))
+    return ReplicateResults(np.concatenate(rows) if rows else np.empty((0, len(FIELDS))))
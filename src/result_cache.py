@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+from runner import DEFAULT_CONFIG, run_config
+
+# Results of run_config keyed by what decides them: the canonical configuration, the source of the
+# modules that compute it and the numpy version (its generators define the streams). Two tiers, both
+# bounded in bytes and evicting the least recently used entry first:
+#   memory    an OrderedDict of (summary, arrays)
+#   disk      <directory>/<key>/summary.json plus one .npy per array, loaded memory-mapped
+# Entries are written to a temporary directory and renamed into place, so processes sharing a cache
+# directory never see half an entry.
+
+# Modules whose source goes into every key
+CODE = ("runner", "population", "random_source", "selection", "online_stats", "mobility")
+SUMMARY = "summary.json"
+# Unfinished entries older than this are removed
+STALE_SECONDS = 3600
+
+# Types every configuration value is normalized to, so 1 and 1.0 (or "1e6" read as a float) give one key
+CONFIG_TYPES = {
+    "seed": int,
+    "n": int,
+    "weight_genetic": float,
+    "rounds": int,
+    "k": int,
+    "bit_generator": str,
+    "intrinsic_mean": float,
+    "intrinsic_sd": float,
+    "extrinsic_mean": float,
+    "extrinsic_sd": float,
+    "dtype": lambda value: np.dtype(value).name,
+    "quantiles": lambda value: None if value is None else int(value),
+}
+
+code_digest = None
+
+
+def code_version():
+    global code_digest
+    if code_digest is None:
+        digest = hashlib.sha256(np.__version__.encode())
+        here = os.path.dirname(os.path.abspath(__file__))
+        for module in CODE:
+            with open(os.path.join(here, f"{module}.py"), "rb") as f:
+                digest.update(f.read())
+        code_digest = digest.hexdigest()
+    return code_digest
+
+
+def canonical(config):
+    unknown = set(config) - set(CONFIG_TYPES)
+    if unknown:
+        raise ValueError(f"unknown configuration keys: {', '.join(sorted(unknown))}")
+    config = {**DEFAULT_CONFIG, **config}
+    if config["seed"] is None:
+        raise ValueError("only seeded configurations can be cached")
+    return json.dumps({key: CONFIG_TYPES[key](value) for key, value in sorted(config.items())}, sort_keys=True, separators=(",", ":"))
+
+
+def config_key(config):
+    return hashlib.sha256((canonical(config) + code_version()).encode()).hexdigest()
+
+
+def entry_bytes(summary, arrays):
+    return len(json.dumps(summary)) + sum(array.nbytes for array in arrays.values())
+
+
+class ResultCache:
+    def __init__(self, directory=None, memory_bytes=256 * 2 ** 20, disk_bytes=4 * 2 ** 30):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, config, phenotypes=False):
+        # (summary, arrays) or None. With phenotypes=True an entry saved without them is a miss
+        key = config_key(config)
+        entry = self.memory.get(key)
+        if entry is not None and (not phenotypes or "phenotype" in entry[1]):
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return entry[:2]
+        entry = self.load(key)
+        if entry is not None and (not phenotypes or "phenotype" in entry[1]):
+            self.remember(key, *entry)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, config, summary, arrays):
+        key = config_key(config)
+        self.remember(key, summary, arrays)
+        if self.directory is not None:
+            self.save(key, summary, arrays)
+
+    def remember(self, key, summary, arrays):
+        size = entry_bytes(summary, arrays)
+        if size > self.memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_used -= self.memory.pop(key)[2]
+        self.memory[key] = (summary, arrays, size)
+        self.memory_used += size
+        while self.memory_used > self.memory_bytes:
+            self.memory_used -= self.memory.popitem(last=False)[1][2]
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def load(self, key):
+        if self.directory is None:
+            return None
+        path = self.path(key)
+        try:
+            with open(os.path.join(path, SUMMARY)) as f:
+                summary = json.load(f)
+            arrays = {name[:-4]: np.load(os.path.join(path, name), mmap_mode="r") for name in os.listdir(path) if name.endswith(".npy")}
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        # Access time for the eviction order; mtime, because atime is often not updated
+        os.utime(path)
+        return summary, arrays
+
+    def save(self, key, summary, arrays):
+        size = entry_bytes(summary, arrays)
+        if size > self.disk_bytes:
+            return
+        partial = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}")
+        os.makedirs(partial)
+        with open(os.path.join(partial, SUMMARY), "w") as f:
+            json.dump(summary, f)
+        for name, array in arrays.items():
+            np.save(os.path.join(partial, f"{name}.npy"), array)
+        shutil.rmtree(self.path(key), ignore_errors=True)
+        try:
+            os.replace(partial, self.path(key))
+        except OSError:
+            # Another process saved the same entry first
+            shutil.rmtree(partial, ignore_errors=True)
+        self.evict()
+
+    def disk_entries(self):
+        # (last use, bytes, path) of every complete entry
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith("."):
+                # Left behind by a process that died while saving
+                try:
+                    if os.path.getmtime(path) < time.time() - STALE_SECONDS:
+                        shutil.rmtree(path, ignore_errors=True)
+                except FileNotFoundError:
+                    pass
+                continue
+            if not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except FileNotFoundError:
+                continue
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.disk_entries()
+        used = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if used <= self.disk_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            used -= size
+
+    def clear(self):
+        self.memory.clear()
+        self.memory_used = 0
+        if self.directory is not None:
+            for _, _, path in self.disk_entries():
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def cached_run(config, cache, phenotypes=False, prefill=False):
+    # run_config through the cache: a hit returns without drawing a single random number
+    entry = cache.get(config, phenotypes)
+    if entry is not None:
+        return entry[0], entry[1]
+    summary, arrays = run_config(config, phenotypes=phenotypes, prefill=prefill)
+    cache.put(config, summary, arrays)
+    return summary, arrays
@@ -0,0 +1,104 @@
+import json
+import os
+import numpy as np
+
+# Per-individual arrays written for every round
+ARRAYS = ("phenotype", "genetic_score", "environmental_score")
+MANIFEST = "manifest.json"
+METADATA = "rounds.jsonl"
+
+# Layout of a round store directory:
+#   manifest.json              n, dtype, arrays and rounds per shard
+#   rounds.jsonl               one JSON object of metadata per round
+#   <array>-<shard>.bin        raw rows of n values, one row per round, appended as rounds arrive
+# Rows are raw C-order arrays, so a shard is a (rounds, n) matrix that np.memmap can open directly.
+
+
+def shard_path(directory, name, shard):
+    return os.path.join(directory, f"{name}-{shard:05d}.bin")
+
+
+class RoundWriter:
+    def __init__(self, directory, n, shard_rounds=256, dtype=np.float64):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.n = n
+        self.shard_rounds = shard_rounds
+        self.dtype = np.dtype(dtype)
+        self.rounds = 0
+        self.files = {}
+
+        with open(os.path.join(directory, MANIFEST), "w") as f:
+            json.dump({"n": n, "dtype": self.dtype.str, "arrays": ARRAYS, "shard_rounds": shard_rounds}, f)
+        self.metadata = open(os.path.join(directory, METADATA), "w")
+
+    def write(self, phenotype, genetic_score, environmental_score, **metadata):
+        # Only the current round is ever held: each array is appended to its shard file and released
+        if self.rounds % self.shard_rounds == 0:
+            self.open_shard(self.rounds // self.shard_rounds)
+        for name, values in zip(ARRAYS, (phenotype, genetic_score, environmental_score)):
+            np.ascontiguousarray(values, dtype=self.dtype).tofile(self.files[name])
+
+        record = {"round": self.rounds, "mean": float(np.mean(phenotype)), "std": float(np.std(phenotype))}
+        record.update(metadata)
+        self.metadata.write(json.dumps(record) + "\n")
+        self.rounds += 1
+
+    def write_population(self, population, **metadata):
+        self.write(population.phenotype, population.genetic_score, population.environmental_score, **metadata)
+
+    def open_shard(self, shard):
+        self.close_shard()
+        self.files = {name: open(shard_path(self.directory, name, shard), "wb") for name in ARRAYS}
+
+    def close_shard(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def close(self):
+        self.close_shard()
+        self.metadata.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RoundReader:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        self.n = manifest["n"]
+        self.dtype = np.dtype(manifest["dtype"])
+        self.arrays = tuple(manifest["arrays"])
+        self.shard_rounds = manifest["shard_rounds"]
+
+        # Row counts come from the file sizes, so a run that was cut short is still readable
+        self.shard_sizes = []
+        row_bytes = self.n * self.dtype.itemsize
+        while os.path.exists(shard_path(directory, self.arrays[0], len(self.shard_sizes))):
+            size = os.path.getsize(shard_path(directory, self.arrays[0], len(self.shard_sizes)))
+            self.shard_sizes.append(size // row_bytes)
+        self.rounds = sum(self.shard_sizes)
+
+    def __len__(self):
+        return self.rounds
+
+    def shard(self, name, shard):
+        # (rounds in shard, n) memory map, nothing is read until it is indexed
+        return np.memmap(shard_path(self.directory, name, shard), dtype=self.dtype, mode="r", shape=(self.shard_sizes[shard], self.n))
+
+    def shards(self, name):
+        for shard in range(len(self.shard_sizes)):
+            yield self.shard(name, shard)
+
+    def round(self, name, r):
+        return self.shard(name, r // self.shard_rounds)[r % self.shard_rounds]
+
+    def metadata(self):
+        with open(os.path.join(self.directory, METADATA)) as f:
+            return [json.loads(line) for line in f][:self.rounds]
@@ -0,0 +1,168 @@
+import numpy as np
+from random_source import RandomSource, MEAN, SD, as_source
+from selection import top_bottom_k
+
+# Upper bound on one environment block, about 128 MB of float64
+MAX_BLOCK_ELEMENTS = 2 ** 24
+# Rounds per block when every round is streamed to a writer, so a streaming run holds at most this many
+STREAM_ROUNDS = 2
+
+
+class RoundSummaries:
+    def __init__(self, rounds, k):
+        self.mean = np.empty(rounds)
+        self.std = np.empty(rounds)
+        self.top_ids = np.empty((rounds, k), dtype=np.int64)
+        self.bottom_ids = np.empty((rounds, k), dtype=np.int64)
+        # Same quantities as track_changes: the change of last round's top/bottom k,
+        # and the change that brought this round's top/bottom k to where they are
+        self.previous_top_changes = np.empty((rounds, k))
+        self.previous_bottom_changes = np.empty((rounds, k))
+        self.new_top_changes = np.empty((rounds, k))
+        self.new_bottom_changes = np.empty((rounds, k))
+
+    def __len__(self):
+        return len(self.mean)
+
+
+class PhenotypeRows:
+    # A run_rounds writer that keeps every round's phenotypes in one (rounds, n) array
+    def __init__(self, rounds, n, dtype=np.float64):
+        self.phenotype = np.empty((rounds, n), dtype=dtype)
+        self.rounds = 0
+
+    def write(self, phenotype, genetic_score, environmental_score, **metadata):
+        self.phenotype[self.rounds] = phenotype
+        self.rounds += 1
+
+
+# Everything that decides the outcome of run_config; prefill and block sizes only change how fast
+# the same numbers are drawn
+DEFAULT_CONFIG = {
+    "seed": None,
+    "n": 100,
+    "weight_genetic": 0.5,
+    "rounds": 10,
+    "k": 5,
+    "bit_generator": "pcg64",
+    "intrinsic_mean": float(MEAN),
+    "intrinsic_sd": float(SD),
+    "extrinsic_mean": float(MEAN),
+    "extrinsic_sd": float(SD),
+    "dtype": "float64",
+    "quantiles": None,
+}
+
+
+def run_rounds(population, rounds, weight_genetic, k=5, block_rounds=None, rng=np.random, writer=None, statistics=None, mobility=None):
+    n = len(population)
+    # top_bottom_k never returns more than n positions
+    k = min(k, n)
+    if block_rounds is None:
+        block_rounds = STREAM_ROUNDS if writer is not None else max(1, MAX_BLOCK_ELEMENTS // n)
+    summaries = RoundSummaries(rounds, k)
+    source = as_source(rng)
+
+    # The genetic component is fixed for the whole run
+    genetic_scores = population.intrinsic_value * weight_genetic
+    previous = population.phenotype_at(weight_genetic)
+    previous_top, previous_bottom = top_bottom_k(previous, k)
+    if mobility is not None:
+        mobility.rebucket(previous)
+
+    start = 0
+    while start < rounds:
+        stop = min(start + block_rounds, rounds)
+        block = source.extrinsic_rounds(stop - start, n)
+        last_extrinsic = block[-1].copy()
+
+        # Turn the environment block into phenotypes in place
+        block *= 1 - weight_genetic
+        block += genetic_scores
+
+        # float64 accumulation whatever the block dtype
+        summaries.mean[start:stop] = block.mean(axis=1, dtype=np.float64)
+        summaries.std[start:stop] = block.std(axis=1, dtype=np.float64)
+        top, bottom = top_bottom_k(block, k)
+        summaries.top_ids[start:stop] = population.id[top]
+        summaries.bottom_ids[start:stop] = population.id[bottom]
+
+        # Each row's predecessor is the row above it, or the carried-over round for the first row
+        previous_top_block = np.vstack([previous_top, top[:-1]])
+        previous_bottom_block = np.vstack([previous_bottom, bottom[:-1]])
+        top_values = np.take_along_axis(block, top, axis=1)
+        bottom_values = np.take_along_axis(block, bottom, axis=1)
+
+        summaries.previous_top_changes[start:stop] = np.take_along_axis(block, previous_top_block, axis=1) - np.vstack([previous[previous_top], top_values[:-1]])
+        summaries.previous_bottom_changes[start:stop] = np.take_along_axis(block, previous_bottom_block, axis=1) - np.vstack([previous[previous_bottom], bottom_values[:-1]])
+        summaries.new_top_changes[start:stop] = top_values - np.vstack([previous[top[0]], np.take_along_axis(block[:-1], top[1:], axis=1)])
+        summaries.new_bottom_changes[start:stop] = bottom_values - np.vstack([previous[bottom[0]], np.take_along_axis(block[:-1], bottom[1:], axis=1)])
+
+        if statistics is not None:
+            # Fold every round into the running accumulators; no round is kept for later
+            statistics.add_round(block[0], previous)
+            for row in range(1, len(block)):
+                statistics.add_round(block[row], block[row - 1])
+
+        if mobility is not None:
+            for phenotypes in block:
+                mobility.update(phenotypes)
+
+        if writer is not None:
+            # Streamed row by row, so the writer never holds more than the current block
+            for phenotypes in block:
+                writer.write(phenotypes, genetic_scores, phenotypes - genetic_scores, weight_genetic=weight_genetic)
+
+        previous = block[-1].copy()
+        previous_top, previous_bottom = top[-1], bottom[-1]
+        start = stop
+
+    # Leave the population where the last round ended, as repeated reshuffles would
+    if rounds:
+        population.extrinsic_value[:] = last_extrinsic
+    population.calculate_phenotype(weight_genetic)
+    return summaries
+
+
+def run_config(config, writer=None, phenotypes=False, prefill=False):
+    # generate -> rounds for one configuration (missing keys take DEFAULT_CONFIG values). Returns the
+    # run's summary and the per-round arrays, plus every round's phenotypes with phenotypes=True
+    from population import Population
+    from online_stats import RoundStatistics, defined
+    from mobility import MobilityMatrix
+    config = {**DEFAULT_CONFIG, **config}
+    rng = RandomSource(config["seed"], config["bit_generator"], config["intrinsic_mean"], config["intrinsic_sd"],
+                       config["extrinsic_mean"], config["extrinsic_sd"], prefill=prefill, dtype=config["dtype"])
+    n, rounds, weight_genetic = config["n"], config["rounds"], config["weight_genetic"]
+    statistics = RoundStatistics()
+    mobility = MobilityMatrix(config["quantiles"]) if config["quantiles"] else None
+    # With a writer the rounds go to the writer instead of memory
+    rows = PhenotypeRows(rounds, n, config["dtype"]) if phenotypes and writer is None else None
+    try:
+        population = Population.generate(n, weight_genetic, rng, config["dtype"])
+        # Rows kept in memory hold every round anyway, so they take the full-size blocks
+        block_rounds = max(1, MAX_BLOCK_ELEMENTS // n) if rows is not None else None
+        summaries = run_rounds(population, rounds, weight_genetic, config["k"], block_rounds, rng=rng, writer=writer if writer is not None else rows,
+                               statistics=statistics, mobility=mobility)
+    finally:
+        rng.close()
+    summary = {
+        "n": n,
+        "rounds": rounds,
+        "weight_genetic": weight_genetic,
+        # An empty accumulator's mean is 0.0, which is not a result
+        "mean": statistics.pooled.mean if statistics.pooled.count else None,
+        "std": statistics.pooled.std,
+        "correlation": statistics.cross_round.correlation,
+        "slope": statistics.cross_round.slope,
+        "previous_top_change": float(summaries.previous_top_changes.mean()) if rounds else None,
+        "previous_bottom_change": float(summaries.previous_bottom_changes.mean()) if rounds else None,
+    }
+    if mobility is not None:
+        summary["mobility"] = mobility.summary()
+    # Whatever an empty accumulator cannot tell (NaN std, correlation, slope) is None, like the mean
+    summary = defined(summary)
+    arrays = dict(vars(summaries))
+    if rows is not None:
+        arrays["phenotype"] = rows.phenotype
+    return summary, arrays
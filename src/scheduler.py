@@ -0,0 +1,91 @@
+import threading
+
+
+class RenderScheduler:
+    # Runs compute(value) on a worker thread and hands the result to apply(result) on the Tk thread.
+    # Values submitted while the worker is busy overwrite each other, so a slider drag only computes
+    # the latest position. Tk is not thread-safe, so the worker never touches widgets: the Tk thread
+    # polls for finished results with after() and applies them with after_idle().
+    def __init__(self, root, compute, apply, poll_ms=15):
+        self.root = root
+        self.compute = compute
+        self.apply = apply
+        self.poll_ms = poll_ms
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.pending = None
+        self.has_pending = False
+        self.result = None
+        self.has_result = False
+        self.generation = 0
+        self.polling = False
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, value):
+        with self.lock:
+            self.pending = value
+            self.has_pending = True
+            self.idle.clear()
+        self.wakeup.set()
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_ms, self.poll)
+
+    def cancel(self):
+        # Drop pending work and any result not applied yet, and wait for the worker to go idle,
+        # so the caller can change the population without racing the worker
+        with self.lock:
+            self.has_pending = False
+            self.has_result = False
+            self.generation += 1
+        self.idle.wait()
+        with self.lock:
+            self.has_result = False
+
+    def close(self):
+        self.closed = True
+        self.cancel()
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            if self.closed:
+                return
+            while True:
+                with self.lock:
+                    if not self.has_pending:
+                        self.idle.set()
+                        break
+                    value = self.pending
+                    generation = self.generation
+                    self.has_pending = False
+                result = self.compute(value)
+                with self.lock:
+                    # A newer result replaces an older one that has not been applied yet
+                    if generation == self.generation:
+                        self.result = (generation, result)
+                        self.has_result = True
+
+    def poll(self):
+        with self.lock:
+            finished = self.result if self.has_result else None
+            self.has_result = False
+            busy = self.has_pending or not self.idle.is_set()
+        if finished is not None:
+            self.root.after_idle(self.deliver, *finished)
+        if busy:
+            self.root.after(self.poll_ms, self.poll)
+        else:
+            self.polling = False
+
+    def deliver(self, generation, result):
+        if generation == self.generation:
+            self.apply(result)
@@ -0,0 +1,53 @@
+import numpy as np
+
+# Partition-based selection: O(n) to find the k extremes, then only those k are sorted.
+# All functions work along the last axis, so a (rounds, n) block selects per round.
+
+
+def top_k(values, k):
+    # Positions of the k largest values, largest first
+    values = np.asarray(values)
+    k = min(k, values.shape[-1])
+    if k <= 0:
+        return np.empty(values.shape[:-1] + (0,), dtype=np.intp)
+    positions = np.argpartition(values, -k, axis=-1)[..., -k:]
+    order = np.argsort(-np.take_along_axis(values, positions, axis=-1), axis=-1)
+    return np.take_along_axis(positions, order, axis=-1)
+
+
+def bottom_k(values, k):
+    # Positions of the k smallest values, smallest first
+    values = np.asarray(values)
+    k = min(k, values.shape[-1])
+    if k <= 0:
+        return np.empty(values.shape[:-1] + (0,), dtype=np.intp)
+    positions = np.argpartition(values, k - 1, axis=-1)[..., :k]
+    order = np.argsort(np.take_along_axis(values, positions, axis=-1), axis=-1)
+    return np.take_along_axis(positions, order, axis=-1)
+
+
+def top_bottom_k(values, k):
+    return top_k(values, k), bottom_k(values, k)
+
+
+def quantile_band(values, lower, upper):
+    # Positions whose rank lies in the [lower, upper) quantile band, e.g. (0.9, 1.0) for the top decile.
+    # The band is unordered; sort it afterwards if the order matters.
+    values = np.asarray(values)
+    n = values.shape[-1]
+    start = int(round(lower * n))
+    stop = int(round(upper * n))
+    if stop <= start:
+        return np.empty(values.shape[:-1] + (0,), dtype=np.intp)
+    return np.argpartition(values, [start, stop - 1], axis=-1)[..., start:stop]
+
+
+def quantile_bands(values, edges):
+    # One band per pair of consecutive edges, e.g. np.linspace(0, 1, 6) for quintiles,
+    # from a single multi-pivot partition instead of one partition per band
+    values = np.asarray(values)
+    n = values.shape[-1]
+    cuts = [int(round(edge * n)) for edge in edges]
+    kth = sorted({cut for cut in cuts if 0 <= cut < n} | {cut - 1 for cut in cuts if 0 < cut <= n})
+    partitioned = np.argpartition(values, kth, axis=-1)
+    return [partitioned[..., start:stop] for start, stop in zip(cuts[:-1], cuts[1:])]
@@ -0,0 +1,174 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from online_stats import defined
+
+# One SimulationCore shared by any number of viewers over TCP, one JSON object per line each way.
+#   {"command": "weight", "weight": 0.3}      set the genetic weight, 0-1
+#   {"command": "reshuffle", "rounds": 10}    reshuffle the environment, default one round
+#   {"command": "summary"}                    the current round, to this client only
+#   {"command": "mobility"}                   the quantile transition matrix, to this client only
+# Every change is broadcast to all clients as a round summary with "event" set to "round" or
+# "weight". Commands are queued and folded before they run: weight changes in a row collapse to
+# the last one and reshuffles in a row to one batch of rounds, so a room full of clients pressing
+# buttons costs about what one client does. Each summary is encoded once and the same bytes are
+# written to every client. The core only ever runs on one worker thread, off the event loop.
+
+# Rounds run between two broadcasts, so a long reshuffle streams out while it runs
+BROADCAST_ROUNDS = 16
+# Clients that stop reading are dropped once this much output is waiting for them
+MAX_CLIENT_BUFFER = 2 ** 22
+MAX_LINE = 2 ** 16
+# Largest single reshuffle request, so one client cannot hold the engine for hours
+MAX_ROUNDS = 10000
+
+
+def encode(event, record):
+    # Strict JSON, so any client's parser accepts it: undefined statistics are sent as null
+    return (json.dumps(defined({"event": event, **record}), allow_nan=False) + "\n").encode()
+
+
+class SimulationServer:
+    def __init__(self, core, host="127.0.0.1", port=8765):
+        self.core = core
+        self.host = host
+        self.port = port
+        self.clients = set()
+        self.handlers = set()
+        self.commands = None
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="engine")
+        self.current = encode("round", core.summary())
+        self.server = None
+
+    async def start(self):
+        self.commands = asyncio.Queue()
+        self.server = await asyncio.start_server(self.connected, self.host, self.port, limit=MAX_LINE)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.engine_task = asyncio.create_task(self.engine())
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.engine_task.cancel()
+            # Connection handlers are finished here, not left for the event loop to cancel on exit
+            for handler in self.handlers:
+                handler.cancel()
+            await asyncio.gather(self.engine_task, *self.handlers, return_exceptions=True)
+            self.clients.clear()
+            await self.server.wait_closed()
+            self.server = None
+        self.executor.shutdown(wait=True)
+
+    async def connected(self, reader, writer):
+        self.clients.add(writer)
+        self.handlers.add(asyncio.current_task())
+        writer.write(self.current)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    self.received(line, writer)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.clients.discard(writer)
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def received(self, line, writer):
+        try:
+            message = json.loads(line)
+            command = message["command"]
+            if command == "weight":
+                value = float(message["weight"])
+                if not 0 <= value <= 1:
+                    raise ValueError("weight must be between 0 and 1")
+            elif command == "reshuffle":
+                value = int(message.get("rounds", 1))
+                if not 1 <= value <= MAX_ROUNDS:
+                    raise ValueError(f"rounds must be between 1 and {MAX_ROUNDS}")
+            elif command in ("summary", "mobility"):
+                value = writer
+            else:
+                raise ValueError(f"unknown command {command!r}")
+        except (ValueError, KeyError, TypeError) as error:
+            self.send(writer, encode("error", {"message": str(error)}))
+            return
+        self.commands.put_nowait((command, value))
+
+    def send(self, writer, data):
+        if writer.is_closing():
+            self.clients.discard(writer)
+        elif writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            # Too far behind; a slow client must not grow the server's memory without bound
+            self.clients.discard(writer)
+            writer.close()
+        else:
+            writer.write(data)
+
+    def broadcast(self, data):
+        for writer in list(self.clients):
+            self.send(writer, data)
+
+    def fold(self, commands):
+        # Runs of the same command collapse into one step, in the order the runs arrived
+        steps = []
+        for command, value in commands:
+            if steps and steps[-1][0] == command == "weight":
+                steps[-1] = (command, value)
+            elif steps and steps[-1][0] == command == "reshuffle":
+                steps[-1] = (command, steps[-1][1] + value)
+            else:
+                steps.append((command, value))
+        return steps
+
+    async def engine(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            commands = [await self.commands.get()]
+            while not self.commands.empty():
+                commands.append(self.commands.get_nowait())
+            for command, value in self.fold(commands):
+                if command == "weight":
+                    self.current = await loop.run_in_executor(self.executor, self.set_weight, value)
+                    self.broadcast(self.current)
+                elif command == "reshuffle":
+                    while value > 0:
+                        rounds = min(value, BROADCAST_ROUNDS)
+                        for data in await loop.run_in_executor(self.executor, self.reshuffle, rounds):
+                            self.broadcast(data)
+                        self.current = data
+                        value -= rounds
+                elif command == "summary":
+                    self.send(value, self.current)
+                elif command == "mobility":
+                    self.send(value, await loop.run_in_executor(self.executor, self.mobility))
+
+    # The methods below run on the engine thread
+
+    def set_weight(self, weight_genetic):
+        self.core.set_weight(weight_genetic)
+        return encode("weight", self.core.summary())
+
+    def reshuffle(self, rounds):
+        encoded = []
+        for _ in range(rounds):
+            self.core.reshuffle()
+            encoded.append(encode("round", self.core.summary()))
+        return encoded
+
+    def mobility(self):
+        return encode("mobility", self.core.mobility.summary())
@@ -0,0 +1,219 @@
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+import numpy as np
+from random_source import RandomSource
+from selection import top_k, bottom_k
+from online_stats import OnlineStats, OnlineCovariance, RoundStatistics
+
+# A population split into contiguous shards, one worker process per shard. The arrays live in
+# shared memory: workers reshuffle and score their own slice in place and send back only k
+# candidates and partial moments, which the parent merges. Ids are implicit (position + 1), as in
+# MemmapPopulation, and the scores are not stored.
+FIELDS = ("intrinsic_value", "extrinsic_value", "phenotype")
+# Elements per step when a shard's phenotype is rebuilt
+BLOCK = 2 ** 16
+
+
+def attach(name):
+    # Workers share the parent's resource tracker, so attaching registers nothing new; the parent
+    # owns the blocks and is the only one that unlinks them
+    return shared_memory.SharedMemory(name=name)
+
+
+class Shard:
+    # One worker's slice of the shared arrays, and the random stream that belongs to it
+    def __init__(self, names, n, start, stop, dtype, seed_sequence, random_options, k):
+        self.memory = [attach(name) for name in names]
+        self.start = start
+        self.k = k
+        self.intrinsic_value, self.extrinsic_value, self.phenotype = [np.ndarray((n,), dtype=dtype, buffer=block.buf)[start:stop] for block in self.memory]
+        # Two block-sized buffers are all a worker keeps of its own; the shard stays in shared memory
+        self.block = np.empty(min(BLOCK, stop - start), dtype=dtype)
+        self.environmental = np.empty_like(self.block)
+        self.source = RandomSource(seed_sequence, dtype=dtype, **(random_options or {}))
+
+    def generate(self, weight_genetic):
+        self.intrinsic_value[:] = self.source.intrinsic(len(self.phenotype))
+        self.source.extrinsic(len(self.phenotype), out=self.extrinsic_value)
+        return self.score(weight_genetic)
+
+    def reshuffle(self, weight_genetic):
+        self.source.extrinsic(len(self.phenotype), out=self.extrinsic_value)
+        pair = self.combine(weight_genetic, OnlineCovariance())
+        return self.candidates(pair.moments())
+
+    def score(self, weight_genetic):
+        self.combine(weight_genetic)
+        return self.candidates()
+
+    def combine(self, weight_genetic, pair=None):
+        # phenotype = intrinsic * weight + extrinsic * (1 - weight), one block at a time. Each new
+        # block is folded into the round-to-round pair with the block it replaces before it is
+        # written, so the previous round is never copied
+        for start in range(0, len(self.phenotype), BLOCK):
+            stop = min(start + BLOCK, len(self.phenotype))
+            block = self.block[:stop - start]
+            environmental = self.environmental[:stop - start]
+            np.multiply(self.intrinsic_value[start:stop], weight_genetic, out=block)
+            np.multiply(self.extrinsic_value[start:stop], 1 - weight_genetic, out=environmental)
+            block += environmental
+            if pair is not None:
+                pair.update(self.phenotype[start:stop], block)
+            self.phenotype[start:stop] = block
+        return pair
+
+    def candidates(self, pair=None):
+        # Every reply is small: moments and the shard's k top and bottom candidates
+        top = top_k(self.phenotype, self.k)
+        bottom = bottom_k(self.phenotype, self.k)
+        return (OnlineStats().update(self.phenotype).moments(), pair,
+                top + self.start, self.phenotype[top].astype(np.float64),
+                bottom + self.start, self.phenotype[bottom].astype(np.float64))
+
+    def close(self):
+        self.source.close()
+        # Views into the blocks have to go before the blocks can be closed
+        self.intrinsic_value = self.extrinsic_value = self.phenotype = None
+        for block in self.memory:
+            block.close()
+
+
+def serve(connection, names, n, start, stop, dtype, seed_sequence, random_options, weight_genetic, k):
+    # Worker loop for one shard
+    shard = Shard(names, n, start, stop, dtype, seed_sequence, random_options, k)
+    try:
+        connection.send(shard.generate(weight_genetic))
+        while True:
+            command, weight_genetic = connection.recv()
+            if command == "close":
+                break
+            if command == "reshuffle":
+                connection.send(shard.reshuffle(weight_genetic))
+            elif command == "weight":
+                connection.send(shard.score(weight_genetic))
+    finally:
+        shard.close()
+        connection.close()
+
+
+class ShardedPopulation:
+    def __init__(self, n, weight_genetic=0.5, k=5, shards=None, seed=None, dtype=np.float64, random_options=None):
+        # Results depend on the seed and the number of shards, not on how the OS schedules the workers
+        self.n = n
+        self.k = k
+        self.weight_genetic = weight_genetic
+        self.dtype = np.dtype(dtype)
+        self.round = 1
+        self.statistics = RoundStatistics()
+        shards = max(1, min(shards or os.cpu_count() or 1, n))
+        self.bounds = np.linspace(0, n, shards + 1).astype(np.int64)
+
+        self.memory = [shared_memory.SharedMemory(create=True, size=max(1, n * self.dtype.itemsize)) for _ in FIELDS]
+        for name, block in zip(FIELDS, self.memory):
+            setattr(self, name, np.ndarray((n,), dtype=self.dtype, buffer=block.buf))
+
+        seed_sequences = np.random.SeedSequence(seed).spawn(shards)
+        context = multiprocessing.get_context()
+        self.workers = []
+        names = [block.name for block in self.memory]
+        try:
+            for shard in range(shards):
+                connection, child = context.Pipe()
+                process = context.Process(target=serve, daemon=True, args=(
+                    child, names, n, int(self.bounds[shard]), int(self.bounds[shard + 1]), self.dtype.str,
+                    seed_sequences[shard], random_options, weight_genetic, k))
+                process.start()
+                child.close()
+                self.workers.append((process, connection))
+            self.merge(self.gather(), new_round=True)
+        except BaseException:
+            # Never leave shared memory behind when a worker fails to start
+            self.close()
+            raise
+
+    def __len__(self):
+        return self.n
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ids(self, positions):
+        return np.asarray(positions) + 1
+
+    def broadcast(self, command, weight_genetic):
+        for _, connection in self.workers:
+            connection.send((command, weight_genetic))
+        return self.gather()
+
+    def gather(self):
+        return [connection.recv() for _, connection in self.workers]
+
+    def merge(self, replies, new_round):
+        # Moments merge exactly; the global top/bottom k are among the shards' k candidates each
+        current = OnlineStats()
+        pair = None
+        for moments, pair_moments, *_ in replies:
+            current.merge_moments(*moments)
+            if pair_moments is not None:
+                pair = (pair or OnlineCovariance()).merge(OnlineCovariance.from_moments(*pair_moments))
+        if new_round:
+            self.statistics.add_round_moments(current, pair)
+        else:
+            self.statistics.current = current
+
+        top_positions = np.concatenate([reply[2] for reply in replies])
+        top_values = np.concatenate([reply[3] for reply in replies])
+        bottom_positions = np.concatenate([reply[4] for reply in replies])
+        bottom_values = np.concatenate([reply[5] for reply in replies])
+        self.top_positions = top_positions[top_k(top_values, self.k)]
+        self.bottom_positions = bottom_positions[bottom_k(bottom_values, self.k)]
+        self.top_ids = self.ids(self.top_positions)
+        self.bottom_ids = self.ids(self.bottom_positions)
+
+    def reshuffle(self, weight_genetic=None):
+        if weight_genetic is not None:
+            self.weight_genetic = weight_genetic
+        self.merge(self.broadcast("reshuffle", self.weight_genetic), new_round=True)
+        self.round += 1
+
+    def set_weight(self, weight_genetic):
+        self.weight_genetic = weight_genetic
+        self.merge(self.broadcast("weight", weight_genetic), new_round=False)
+
+    def summary(self):
+        # Same fields as SimulationCore.summary where they apply
+        summary = {
+            "round": self.round,
+            "n": self.n,
+            "shards": len(self.workers),
+            "weight_genetic": float(self.weight_genetic),
+            "mean": self.statistics.current.mean,
+            "std": self.statistics.current.std,
+            "top_ids": self.top_ids.tolist(),
+            "bottom_ids": self.bottom_ids.tolist(),
+        }
+        if self.statistics.rounds > 1:
+            summary["correlation"] = self.statistics.cross_round.correlation
+            summary["slope"] = self.statistics.cross_round.slope
+        return summary
+
+    def close(self):
+        for process, connection in self.workers:
+            try:
+                connection.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process, connection in self.workers:
+            process.join()
+            connection.close()
+        self.workers = []
+        for name in FIELDS:
+            setattr(self, name, None)
+        for block in self.memory:
+            block.close()
+            block.unlink()
+        self.memory = []
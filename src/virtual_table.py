@@ -0,0 +1,92 @@
+from tkinter import ttk
+import numpy as np
+
+
+class VirtualTable:
+    # A Treeview with a fixed pool of `height` rows. The data lives in NumPy arrays and only the
+    # rows scrolled into view are formatted and pushed to Tk, so a refresh costs O(height) Tk calls
+    # whatever the population size.
+    def __init__(self, parent, columns, formats, height=20, width=100):
+        self.columns = columns
+        self.formats = formats
+        self.height = height
+        self.data = [np.empty(0) for _ in columns]
+        self.first = 0
+        self.sort_column = None
+        self.sort_descending = False
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show='headings', height=height)
+        for column in columns:
+            self.tree.heading(column, text=column, command=lambda column=column: self.sort_by(column))
+            self.tree.column(column, width=width)
+        self.tree.grid(row=0, column=0)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self.on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        self.items = [self.tree.insert('', 'end', values=()) for _ in range(height)]
+
+        # Mouse wheel on Windows/macOS and on X11
+        self.tree.bind('<MouseWheel>', lambda event: self.scroll(-1 if event.delta > 0 else 1))
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-1))
+        self.tree.bind('<Button-5>', lambda event: self.scroll(1))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def __len__(self):
+        return len(self.data[0])
+
+    def column(self, column, **kwargs):
+        self.tree.column(column, **kwargs)
+
+    def set_data(self, *data):
+        # One array per column, all of the same length; the arrays are referenced, not copied
+        self.data = data
+        self.refresh()
+
+    def visible_positions(self):
+        n = len(self)
+        stop = min(self.first + self.height, n)
+        if self.sort_column is None:
+            return np.arange(self.first, stop)
+        # Only ranks [first, stop) are needed, so partition instead of sorting the whole column
+        key = self.data[self.columns.index(self.sort_column)]
+        if self.sort_descending:
+            key = -key
+        window = np.argpartition(key, [self.first, stop - 1])[self.first:stop]
+        return window[np.argsort(key[window], kind='stable')]
+
+    def refresh(self):
+        n = len(self)
+        self.first = max(0, min(self.first, n - self.height))
+        positions = self.visible_positions() if n else []
+        for item, position in zip(self.items, positions):
+            self.tree.item(item, values=tuple(f.format(values[position]) for f, values in zip(self.formats, self.data)))
+        for item in self.items[len(positions):]:
+            self.tree.item(item, values=())
+        if n:
+            self.scrollbar.set(self.first / n, (self.first + len(positions)) / n)
+
+    def scroll(self, rows):
+        self.first += rows
+        self.refresh()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.first = int(float(amount) * len(self))
+            self.refresh()
+        elif action == 'scroll':
+            self.scroll(int(amount) * (self.height if unit == 'pages' else 1))
+
+    def sort_by(self, column):
+        # Clicking the same heading again flips the direction
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        self.first = 0
+        self.refresh()
@@ -0,0 +1,51 @@
+import numpy as np
+from online_stats import OnlineCovariance
+
+# phenotype = w * intrinsic + (1 - w) * extrinsic is affine in w, so the mean, variance and
+# covariances of the phenotype follow from the moments of (intrinsic, extrinsic) for any weight.
+
+
+class WeightSweep:
+    def __init__(self, population):
+        self.population = population
+        self.refresh()
+
+    def refresh(self):
+        # Call after the environment is reshuffled; one O(n) pass, after which every query is O(1)
+        self.moments = OnlineCovariance().update(self.population.intrinsic_value, self.population.extrinsic_value)
+        self.mean_intrinsic = self.moments.x.mean
+        self.mean_extrinsic = self.moments.y.mean
+        self.var_intrinsic = self.moments.x.variance()
+        self.var_extrinsic = self.moments.y.variance()
+        self.cov = self.moments.covariance()
+
+    def mean(self, weight_genetic):
+        return weight_genetic * self.mean_intrinsic + (1 - weight_genetic) * self.mean_extrinsic
+
+    def variance(self, weight_genetic):
+        w = weight_genetic
+        return w ** 2 * self.var_intrinsic + (1 - w) ** 2 * self.var_extrinsic + 2 * w * (1 - w) * self.cov
+
+    def std(self, weight_genetic):
+        return np.sqrt(self.variance(weight_genetic))
+
+    def genetic_correlation(self, weight_genetic):
+        # Correlation between phenotype and the intrinsic value
+        w = weight_genetic
+        covariance = w * self.var_intrinsic + (1 - w) * self.cov
+        return covariance / np.sqrt(self.var_intrinsic * self.variance(w))
+
+    def round_correlation(self, weight_genetic):
+        # Expected correlation between two rounds when the extrinsic value is redrawn independently:
+        # the share of phenotype variance that survives a reshuffle, which is what regresses to the mean
+        w = weight_genetic
+        return w ** 2 * self.var_intrinsic / self.variance(w)
+
+    def phenotypes(self, weights):
+        # (len(weights), n) phenotype matrix for a whole grid of weights in one outer product
+        weights = np.asarray(weights, dtype=self.population.intrinsic_value.dtype)[:, np.newaxis]
+        return weights * self.population.intrinsic_value + (1 - weights) * self.population.extrinsic_value
+
+    def slider_grid(self):
+        # Phenotypes for all 101 positions of the 0-100 slider
+        return self.phenotypes(np.linspace(0, 1, 101))